@@ -2,6 +2,7 @@ import logging
 
 from rest_framework import serializers
 
+from core.management.utils.tree_utils import TermSetTree
 from core.models import SchemaLedger, TermSet, TransformationLedger
 
 logger = logging.getLogger('dict_config_logger')
@@ -19,13 +20,17 @@ class SchemaLedgerSerializer(serializers.ModelSerializer):
 
 class TermSetSerializer(serializers.ModelSerializer):
     """Serializes the TermSet Model"""
-    schema = serializers.DictField(source='export')
+    schema = serializers.SerializerMethodField()
 
     class Meta:
         model = TermSet
 
         fields = ('iri', 'name', 'version', 'schema')
 
+    def get_schema(self, obj):
+        """Export the whole Term Set tree from a single load"""
+        return TermSetTree(obj).export()
+
 
 class TransformationLedgerSerializer(serializers.ModelSerializer):
     """Serializes the SchemaLedger Model"""
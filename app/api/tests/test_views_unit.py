@@ -5,6 +5,8 @@ from django.test import tag
 from django.urls import reverse
 from rest_framework import status
 
+from core.models import SchemaLedger, Term
+
 from .test_setup import TestSetUp
 
 
@@ -39,6 +41,18 @@ class ViewTests(TestSetUp):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(responseDict["iri"], self.sourceTS.iri)
 
+    def test_schemaledger_requests_latest_version(self):
+        """Test that the latest version is picked numerically"""
+        url = "%s?name=test_name" % (reverse('api:schemaledger'))
+        SchemaLedger(schema_name="test_name", metadata=self.metadata,
+                     status="published", version="1.10.0").save()
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["version"], "1.10.0")
+
     def test_schemaledger_requests_no_version_found(self):
         """Test that making a get request to the schema api with a version
             that doesn't exist returns an error"""
@@ -72,6 +86,173 @@ class ViewTests(TestSetUp):
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertEqual(responseDict["iri"], self.sourceTS.iri)
 
+    def test_schemaledger_requests_snapshot(self):
+        """Test that the schema api serves the stored export"""
+        url = "%s?name=test_name&version=1.2.3" % (reverse('api:schemaledger'))
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema"], self.metadata)
+        self.assertEqual(responseDict["version"], "1.2.3")
+
+    def test_schemaledger_requests_stream(self):
+        """Test that the streamed schema response matches the stored one"""
+        url = "%s?name=test_name&version=1.2.3" % (reverse('api:schemaledger'))
+
+        response = self.client.get(url)
+        streamed = self.client.get(url + "&stream=true")
+
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join(streamed.streaming_content),
+                         response.content)
+
+    def test_schemaledger_requests_not_modified(self):
+        """Test that the schema api answers a matching ETag with a 304
+        and sends a new ETag once the tree changes"""
+        url = "%s?name=test_name&version=1.2.3" % (reverse('api:schemaledger'))
+
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        term = Term.objects.filter(root=self.sourceTS).first()
+        term.description = 'changed'
+        term.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_schemaledger_requests_child_not_modified(self):
+        """Test that the ETag of a Child Term Set changes with its tree"""
+        url = "%s?iri=%s/Course" % (reverse('api:schemaledger'),
+                                    self.sourceSchema.schema_iri)
+
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        term = Term.objects.filter(root=self.sourceTS).first()
+        term.description = 'changed'
+        term.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(b'"changed"', response.content)
+
+    def test_schemaledger_batch_requests(self):
+        """Test that the batch schema api resolves every item in a fixed
+        number of queries and reports errors per item"""
+        url = reverse('api:schemaledger-batch')
+        items = [{"name": "test_name", "version": "1.2.3"},
+                 {"name": "test_name"},
+                 {"iri": self.sourceTS.iri},
+                 {"name": "test_name", "version": "9.9.9"},
+                 {"name": "missing"},
+                 {"iri": "xss:0.0.1@missing"},
+                 {}]
+
+        with self.assertNumQueries(3):
+            response = self.client.post(url, items, format='json')
+        results = json.loads(response.content)["results"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(results), len(items))
+        for result in results[:3]:
+            self.assertEqual(result["iri"], self.sourceTS.iri)
+            self.assertEqual(result["schema"], self.metadata)
+        self.assertEqual(results[3]["message"],
+                         ["Error; no schema found for version '9.9.9'"])
+        self.assertEqual(results[4]["message"],
+                         ["Error; no schema found with the name 'missing'"])
+        self.assertEqual(results[5]["message"],
+                         ["Error; no schema found with the iri "
+                          "'xss:0.0.1@missing'"])
+        self.assertEqual(results[6]["message"],
+                         ["Error; 'name' or 'iri' is required"])
+
+    def test_schemaledger_batch_requests_bad_body(self):
+        """Test that the batch schema api rejects a body that is not a list
+        of objects"""
+        response = self.client.post(reverse('api:schemaledger-batch'),
+                                    {"name": "test_name"}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_schemaledger_diff_requests(self):
+        """Test that the diff api returns the added, removed and changed
+        Terms between two versions"""
+        metadata = {"Course": {**self.metadata["Course"],
+                               "CourseCode": {"use": "Optional"},
+                               "CourseRating": {"use": "Optional"}}}
+        del metadata["Course"]["CourseTitle"]
+        SchemaLedger(schema_name="test_name", metadata=metadata,
+                     status="published", version="1.3.0", major_version=1,
+                     minor_version=3).save()
+        url = "%s?name=test_name&fromVersion=1.2.3&toVersion=1.3.0" % (
+            reverse('api:schemaledger-diff'))
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["added"],
+                         {"Course.CourseRating": {"use": "Optional"}})
+        self.assertEqual(responseDict["removed"],
+                         {"Course.CourseTitle": {"use": "Required",
+                                                 "data_type": "str"}})
+        self.assertEqual(responseDict["changed"],
+                         {"Course.CourseCode": {
+                             "from": {"use": "Required", "data_type": "int"},
+                             "to": {"use": "Optional"}}})
+
+    def test_schemaledger_diff_requests_no_version_found(self):
+        """Test that the diff api reports versions that do not exist"""
+        url = "%s?name=test_name&fromVersion=1.2.3&toVersion=9.9.9" % (
+            reverse('api:schemaledger-diff'))
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(responseDict["message"],
+                         ["Error; no schema found for version '9.9.9'"])
+
+    def test_schemaledger_catalog_requests(self):
+        """Test that the catalog pages through the schemas in name and
+        version order with their counts"""
+        url = reverse('api:schemaledger-catalog')
+
+        first = json.loads(self.client.get(url + "?limit=1").content)
+        self.assertEqual([root["iri"] for root in first["results"]],
+                         [self.sourceTS.iri])
+        self.assertTrue(first["has_more"])
+        self.assertEqual(first["results"][0]["term_count"],
+                         Term.objects.filter(root=self.sourceTS).count())
+
+        rest = json.loads(self.client.get(
+            url + "?cursor=" + first["next_cursor"]).content)
+        self.assertEqual([root["iri"] for root in rest["results"]],
+                         [self.targetTS.iri])
+        self.assertFalse(rest["has_more"])
+
+        filtered = json.loads(self.client.get(
+            url + "?name=test_name_&status=published").content)
+        self.assertEqual([root["iri"] for root in filtered["results"]],
+                         [self.targetTS.iri])
+
+    def test_schemaledger_catalog_requests_bad_cursor(self):
+        """Test that the catalog rejects an invalid cursor"""
+        response = self.client.get(
+            reverse('api:schemaledger-catalog') + "?cursor=bad")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_schemaledger_requests_iri_fail(self):
         """Test that making a get request to the schema api with just an
             iri should fail correctly"""
@@ -163,19 +344,77 @@ class ViewTests(TestSetUp):
         self.sourceSchema.save()
         self.targetSchema.save()
         self.mapping.save()
-        with patch('api.views.TermSet.objects') as mappingObj:
-            mappingObj.return_value = mappingObj
-            mappingObj.all.return_value = mappingObj
-            mappingObj.filter.return_value = mappingObj
-            mappingObj.first.side_effect = [
-                self.sourceSchema, self.targetSchema]
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
 
-            response = self.client.get(url)
-            responseDict = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema_mapping"],
+                         self.schema_mapping)
 
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(responseDict["schema_mapping"],
-                             self.schema_mapping)
+    def test_transformationledger_batch_requests(self):
+        """Test that the batch mappings api returns every pair in order
+        with errors per item"""
+        self.mapping.save()
+        url = reverse('api:transformationledger-batch')
+        pair = {"sourceName": "test_name", "targetName": "test_name_1"}
+        items = [pair,
+                 {"sourceIRI": self.sourceTS.iri,
+                  "targetIRI": self.targetTS.iri},
+                 {**pair, "sourceVersion": "9.9.9"},
+                 {"sourceName": "test_name"}]
+
+        response = self.client.post(url, items, format='json')
+        results = json.loads(response.content)["results"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for result in results[:2]:
+            self.assertEqual(result["source"], self.sourceTS.iri)
+            self.assertEqual(result["target"], self.targetTS.iri)
+            self.assertEqual(result["schema_mapping"], self.schema_mapping)
+        self.assertEqual(results[2]["message"],
+                         ["Error; no source schema found for version "
+                          "'9.9.9'"])
+        self.assertEqual(results[3]["message"],
+                         ["Error; query parameter 'targetName' or "
+                          "'targetIRI' is required"])
+
+    def test_transformationledger_batch_requests_all_sources(self):
+        """Test that the batch mappings api returns the mappings of every
+        published source of a target"""
+        self.mapping.save()
+        url = reverse('api:transformationledger-batch')
+
+        response = self.client.post(url, {"targetName": "test_name_1"},
+                                    format='json')
+        results = json.loads(response.content)["results"]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["source"], self.sourceTS.iri)
+        self.assertEqual(results[0]["schema_mapping"], self.schema_mapping)
+
+    def test_transformationledger_composed_requests(self):
+        """Test that the composed mappings api follows a chain of ledgers
+        and reports missing chains"""
+        self.mapping.save()
+        url = reverse('api:transformationledger-composed')
+
+        response = self.client.get(
+            url + f"?sourceIRI={self.sourceTS.iri}&"
+                  f"targetIRI={self.targetTS.iri}")
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["path"],
+                         [self.sourceTS.iri, self.targetTS.iri])
+        self.assertEqual(responseDict["schema_mapping"],
+                         self.schema_mapping)
+
+        response = self.client.get(
+            url + f"?sourceIRI={self.targetTS.iri}&"
+                  f"targetIRI={self.sourceTS.iri}")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_transformationledger_requests_no_version(self):
         """Test that making a get request to the mappings api with no versions
@@ -186,19 +425,12 @@ class ViewTests(TestSetUp):
         self.sourceSchema.save()
         self.targetSchema.save()
         self.mapping.save()
-        with patch('api.views.TermSet.objects') as mappingObj:
-            mappingObj.return_value = mappingObj
-            mappingObj.all.return_value = mappingObj
-            mappingObj.filter.return_value = mappingObj
-            mappingObj.first.side_effect = [
-                self.sourceSchema, self.targetSchema]
-
-            response = self.client.get(url)
-            responseDict = json.loads(response.content)
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
 
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(responseDict["schema_mapping"],
-                             self.schema_mapping)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema_mapping"],
+                         self.schema_mapping)
 
     def test_transformationledger_requests_wrong_source_version(self):
         """Test that making a get request to the mappings api
@@ -245,19 +477,35 @@ class ViewTests(TestSetUp):
         url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
                f"targetIRI={self.targetSchema.schema_iri}") % (
             reverse('api:transformationledger'))
-        with patch('api.views.TermSet.objects') as mappingObj:
-            mappingObj.return_value = mappingObj
-            mappingObj.all.return_value = mappingObj
-            mappingObj.filter.return_value = mappingObj
-            mappingObj.first.side_effect = [
-                self.sourceSchema, self.targetSchema]
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
 
-            response = self.client.get(url)
-            responseDict = json.loads(response.content)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema_mapping"],
+                         self.schema_mapping)
 
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertEqual(responseDict["schema_mapping"],
-                             self.schema_mapping)
+    def test_child_term_set_requests(self):
+        """Test that the schema and mappings apis export the subtree of a
+            Child Term Set"""
+        self.mapping.save()
+        url = "%s?iri=%s/Course" % (reverse('api:schemaledger'),
+                                    self.sourceSchema.schema_iri)
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema"]["CourseCode"],
+                         {"use": "Required", "data_type": "int"})
+
+        url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
+               f"targetIRI={self.targetSchema.schema_iri}/Course") % (
+            reverse('api:transformationledger'))
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["schema_mapping"],
+                         self.schema_mapping["Course"])
 
     def test_transformationledger_requests_iris_no_source(self):
         """Test that making a get request to the mappings api with iris
@@ -288,3 +536,201 @@ class ViewTests(TestSetUp):
         expected_error = ["Error; no schema found with the iri 'testtest'"]
         self.assertEqual(responseDict['message'], expected_error)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_feed_requests(self):
+        """Test that the change feed pages through changes with cursors and
+        captures retirements and deletions"""
+        url = reverse('api:changes')
+
+        first = json.loads(self.client.get(url + "?limit=2").content)
+        self.assertEqual(len(first["results"]), 2)
+        self.assertTrue(first["has_more"])
+
+        rest = json.loads(self.client.get(
+            url + "?limit=1000&cursor=" + first["next_cursor"]).content)
+        self.assertFalse(rest["has_more"])
+        self.assertIn({"kind": "tree", "iri": self.targetTS.iri},
+                      [{"kind": event["kind"], "iri": event["iri"]}
+                       for event in rest["results"]])
+
+        self.sourceSchema.status = "retired"
+        self.sourceSchema.save()
+        SchemaLedger.objects.filter(pk=self.targetSchema.pk).delete()
+        changes = json.loads(self.client.get(
+            url + "?limit=1000&cursor=" + rest["next_cursor"]).content)
+        events = [(event["kind"], event["action"], event["iri"],
+                   event["status"]) for event in changes["results"]]
+
+        self.assertIn(("tree", "updated", self.sourceTS.iri, "retired"),
+                      events)
+        self.assertIn(("schema_ledger", "deleted", self.targetTS.iri,
+                       "published"), events)
+
+    def test_change_feed_requests_bad_cursor(self):
+        """Test that the change feed rejects an invalid cursor"""
+        response = self.client.get(reverse('api:changes') + "?cursor=bad")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_change_feed_requests_bad_limit(self):
+        """Test that the change feed rejects limits below one"""
+        for limit in ('-5', '0'):
+            response = self.client.get(
+                reverse('api:changes') + "?limit=" + limit)
+
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_term_search_requests(self):
+        """Test that the search api returns matching Terms best first"""
+        url = "%s?q=course+tit*&name=test_name" % (reverse('api:term-search'))
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["results"][0]["iri"],
+                         "xss:1.2.3@test_name/Course?CourseTitle")
+        self.assertEqual(responseDict["results"][0]["data_type"], "str")
+
+    def test_term_search_requests_no_query(self):
+        """Test that the search api requires a query"""
+        response = self.client.get(reverse('api:term-search'))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_term_search_requests_bad_limit(self):
+        """Test that the search api rejects limits below one"""
+        for limit in ('-5', '0'):
+            response = self.client.get(reverse('api:term-search') +
+                                       "?q=course&limit=" + limit)
+
+            self.assertEqual(response.status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_term_mapping_requests(self):
+        """Test that the reverse mapping api returns the target Terms mapped
+        to a source Term Set"""
+        self.mapping.save()
+        url = "%s?iri=%s/Course" % (reverse('api:term-mappings'),
+                                    self.sourceTS.iri)
+
+        response = self.client.get(url)
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            responseDict["mappings"],
+            {self.sourceTS.iri + "/Course?CourseProviderName": [
+                {"iri": self.targetTS.iri + "/Course?CourseProviderName",
+                 "schema": self.targetTS.iri,
+                 "path": "Course.CourseProviderName"}]})
+
+    def test_transformation_requests_records(self):
+        """Test that the transform api converts records with the stored
+            mappings"""
+        self.mapping.save()
+        url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
+               f"targetIRI={self.targetSchema.schema_iri}") % (
+            reverse('api:transformation'))
+        records = [{"Course": {"CourseProviderName": "DAU",
+                               "CourseTitle": "Title"}},
+                   {"Course": {}}]
+
+        response = self.client.post(url, records, format='json')
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["records"],
+                         [{"Course": {"CourseProviderName": "DAU"}}, {}])
+
+    def test_transformation_requests_ndjson(self):
+        """Test that the transform api accepts and returns NDJSON"""
+        self.mapping.save()
+        url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
+               f"targetIRI={self.targetSchema.schema_iri}") % (
+            reverse('api:transformation'))
+        body = '{"Course": {"CourseProviderName": "DAU"}}\n\n{}\n'
+
+        response = self.client.post(url, body,
+                                    content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode().splitlines(),
+                         ['{"Course": {"CourseProviderName": "DAU"}}', '{}'])
+
+    def test_transformation_requests_no_mapping(self):
+        """Test that the transform api rejects schemas no chain of mappings
+            joins"""
+        url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
+               f"targetIRI={self.targetSchema.schema_iri}") % (
+            reverse('api:transformation'))
+
+        response = self.client.post(url, [{"Course": {}}], format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_transformation_requests_bad_body(self):
+        """Test that the transform api rejects bodies that are not lists of
+            records"""
+        url = (f"%s?sourceIRI={self.sourceSchema.schema_iri}&"
+               f"targetIRI={self.targetSchema.schema_iri}") % (
+            reverse('api:transformation'))
+
+        response = self.client.post(url, {"Course": {}}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_validation_requests_records(self):
+        """Test that the validate api returns the errors of each record"""
+        url = "%s?name=test_name&version=1.2.3" % (reverse('api:validation'))
+        record = {"Course": {"CourseProviderName": "DAU",
+                             "DepartmentName": "DoD",
+                             "CourseCode": 1,
+                             "CourseTitle": "Title",
+                             "CourseShortDescription": "Short",
+                             "CourseAudience": "All",
+                             "CoursePrerequisites": "None",
+                             "CourseSubjectMatter": "Math",
+                             "AccreditedBy": "DAU"}}
+        bad_record = {"Course": {"CourseCode": "1", "Extra": "x"}}
+
+        response = self.client.post(url, [record, bad_record],
+                                    format='json')
+        responseDict = json.loads(response.content)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(responseDict["valid"], 1)
+        self.assertEqual(responseDict["errors"][0], [])
+        self.assertIn("Course.CourseCode: expected int",
+                      responseDict["errors"][1])
+        self.assertIn("Course.CourseTitle: required field is missing",
+                      responseDict["errors"][1])
+        self.assertIn("Course.Extra: unexpected field",
+                      responseDict["errors"][1])
+
+    def test_validation_requests_child_records(self):
+        """Test that the validate api checks records against a Child Term
+            Set and recompiles once a Term below it changes"""
+        url = "%s?iri=xss:1.2.3@test_name/Course" % (
+            reverse('api:validation'))
+        record = {"CourseProviderName": "DAU",
+                  "DepartmentName": "DoD",
+                  "CourseCode": 1,
+                  "CourseTitle": "Title",
+                  "CourseShortDescription": "Short",
+                  "CourseAudience": "All",
+                  "CoursePrerequisites": "None",
+                  "CourseSubjectMatter": "Math",
+                  "AccreditedBy": "DAU"}
+
+        response = self.client.post(url, [record], format='json')
+        self.assertEqual(json.loads(response.content)["errors"], [[]])
+
+        term = Term.objects.get(iri='xss:1.2.3@test_name/Course?CourseTitle')
+        term.status = 'retired'
+        term.save()
+        response = self.client.post(url, [record], format='json')
+
+        self.assertEqual(json.loads(response.content)["errors"],
+                         [["CourseTitle: unexpected field"]])
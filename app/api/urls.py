@@ -9,6 +9,26 @@ app_name = 'api'
 urlpatterns = [
      path('schemas/', views.SchemaLedgerDataView.as_view(),
           name='schemaledger'),
+     path('schemas/batch/', views.SchemaBatchDataView.as_view(),
+          name='schemaledger-batch'),
+     path('schemas/diff/', views.SchemaDiffDataView.as_view(),
+          name='schemaledger-diff'),
+     path('schemas/catalog/', views.SchemaCatalogDataView.as_view(),
+          name='schemaledger-catalog'),
      path('mappings/', views.TransformationLedgerDataView.as_view(),
           name='transformationledger'),
+     path('mappings/batch/', views.MappingBatchDataView.as_view(),
+          name='transformationledger-batch'),
+     path('mappings/composed/', views.ComposedMappingDataView.as_view(),
+          name='transformationledger-composed'),
+     path('changes/', views.ChangeFeedDataView.as_view(),
+          name='changes'),
+     path('terms/search/', views.TermSearchDataView.as_view(),
+          name='term-search'),
+     path('terms/mapped/', views.TermMappingDataView.as_view(),
+          name='term-mappings'),
+     path('transform/', views.TransformationDataView.as_view(),
+          name='transformation'),
+     path('validate/', views.ValidationDataView.as_view(),
+          name='validation'),
 ]
@@ -1,27 +1,111 @@
+import hashlib
+import json
 import logging
+from collections import defaultdict
 
 from django.core.exceptions import ObjectDoesNotExist
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 from requests.exceptions import HTTPError
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from api.serializers import TermSetSerializer
-from core.management.utils.xss_helper import sort_version
+from core.management.utils.catalog_utils import (CATALOG_LIMIT,
+                                                 MAX_CATALOG_LIMIT,
+                                                 catalog_page,
+                                                 encode_catalog_cursor)
+from core.management.utils.change_utils import (CHANGE_LIMIT,
+                                                MAX_CHANGE_LIMIT,
+                                                changes_since, encode_cursor)
+from core.management.utils.diff_utils import get_diff
+from core.management.utils.search_utils import (MAX_SEARCH_LIMIT,
+                                                SEARCH_LIMIT, search_terms)
+from core.management.utils.snapshot_utils import get_snapshot, get_snapshots
+from core.management.utils.transform_utils import (find_mapping_path,
+                                                   get_composed_mapping,
+                                                   get_plan)
+from core.management.utils.tree_utils import (TermSetTree, mapped_terms,
+                                              stream_export)
+from core.management.utils.validation_utils import get_validator
 from core.models import TermSet
 
 logger = logging.getLogger('dict_config_logger')
 
-
-def check_status(messages, queryset):
-    queryset = queryset.filter(status='published')
-    if not queryset:
-        message = "Error fetching record, no " \
-                  "published record with required parameters"
-        messages.append(message)
-        logger.error(message)
-        raise ObjectDoesNotExist()
-    return queryset
+NDJSON = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def schema_content(term_set, snapshot):
+    """Build the schema body of a Term Set from the stored export bytes"""
+    head = JSONRenderer().render({'iri': term_set.iri,
+                                  'name': term_set.name,
+                                  'version': term_set.version})
+    return head[:-1] + b',"schema":' + bytes(snapshot.content) + b'}'
+
+
+def snapshot_response(term_set):
+    """Build the schema response from the stored export bytes"""
+    content = schema_content(term_set, get_snapshot(term_set))
+    return HttpResponse(content, content_type='application/json',
+                        status=status.HTTP_200_OK)
+
+
+def stream_schema(term_set):
+    """Yield the schema response of a Term Set in chunks while walking the
+    tree, without building the export"""
+    head = JSONRenderer().render({'iri': term_set.iri,
+                                  'name': term_set.name,
+                                  'version': term_set.version})
+    chunk = head[:-1] + b',"schema":'
+    for piece in stream_export(term_set.iri):
+        chunk += piece
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield chunk
+            chunk = b''
+    yield chunk + b'}'
+
+
+def streaming_response(term_set):
+    """Build the schema response as a stream of the walked tree"""
+    return StreamingHttpResponse(stream_schema(term_set),
+                                 content_type='application/json',
+                                 status=status.HTTP_200_OK)
+
+
+def conditional_response(request, term_sets, build):
+    """Answer a conditional GET from the generations of the root Term
+    Sets behind the response, only calling build when they changed"""
+    # only roots are touched when their tree changes
+    roots = {term_set.iri: (term_set.generation, term_set.modified)
+             for term_set in term_sets
+             if term_set.iri == term_set.root_term_set()}
+    missing = {term_set.root_term_set() for term_set in term_sets} - \
+        set(roots)
+    if missing:
+        roots.update((iri, (generation, modified)) for iri, generation,
+                     modified in TermSet.objects.filter(
+                         iri__in=missing).values_list(
+                         'iri', 'generation', 'modified'))
+
+    key = ';'.join(f'{term_set.iri}:{roots[term_set.root_term_set()][0]}'
+                   for term_set in term_sets)
+    etag = '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+    last_modified = int(max(roots[term_set.root_term_set()][1]
+                            for term_set in term_sets).timestamp())
+
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
 
 
 class SchemaLedgerDataView(GenericAPIView):
@@ -33,8 +117,6 @@ class SchemaLedgerDataView(GenericAPIView):
         """This method defines the API's to retrieve data
         from the Schema Ledger"""
 
-        queryset = self.get_queryset()
-
         # all requests must provide the schema name
         messages = []
         name = request.GET.get('name')
@@ -45,72 +127,397 @@ class SchemaLedgerDataView(GenericAPIView):
             "message": messages
         }
 
+        if not name and not iri:
+            messages.append("Error; query parameter 'name' or 'iri'"
+                            " is required")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            queryset = self._filter_schema(name, version, iri, messages)
+        except ObjectDoesNotExist:
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            term_set = queryset[0]
+            logger.info(term_set)
+            # only way messages gets sent is if there was
+            # an error serializing or in the response process.
+            messages.append(
+                "Error fetching records please check the logs.")
+            # very large schemas can be streamed instead of loaded whole
+            if request.GET.get('stream', '').lower() in ('true', '1'):
+                build = streaming_response
+            else:
+                build = snapshot_response
+            return conditional_response(
+                request, [term_set], lambda: build(term_set))
+        except ObjectDoesNotExist:
+            errorMsg = {
+                "message": messages
+            }
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except HTTPError as http_err:
+            logger.error(http_err)
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except Exception as err:
+            logger.error(err)
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _filter_schema(self, name, version, iri, messages):
+        queryset = self.get_queryset()
         if name:
             # look for a model with the provided name
             queryset = queryset.filter(name=name)
 
-            if not queryset:
+            if not queryset.exists():
                 messages.append("Error; no schema found with the name '" +
                                 name + "'")
-                errorMsg = {
-                    "message": messages
-                }
-                return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+                raise ObjectDoesNotExist()
 
             # if the schema name is found, filter for the version.
             # If no version is provided, we fetch the latest version
             if not version:
-                queryset = [ts for ts in queryset]
-                queryset = sort_version(queryset, reverse_order=True)
+                queryset = queryset.order_by(*TermSet.LATEST_VERSION)
             else:
                 queryset = queryset.filter(version=version)
 
-            if not queryset:
-                messages.append("Error; no schema found for version '" +
-                                version + "'")
-                errorMsg = {
-                    "message": messages
-                }
-                return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+                if not queryset:
+                    messages.append("Error; no schema found for version '" +
+                                    version + "'")
+                    raise ObjectDoesNotExist()
         elif iri:
-            # look for a model with the provided name
+            # look for a model with the provided iri
             queryset = queryset.filter(iri=iri)
 
             if not queryset:
                 messages.append("Error; no schema found with the iri '" +
                                 iri + "'")
-                errorMsg = {
-                    "message": messages
-                }
-                return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
-        else:
-            messages.append("Error; query parameter 'name' or 'iri'"
-                            " is required")
+                raise ObjectDoesNotExist()
+        return queryset
+
+
+class SchemaBatchDataView(GenericAPIView):
+    """Handles HTTP requests for several schemas at once"""
+    http_method_names = ['post', 'options']
+    permission_classes = [AllowAny]
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def post(self, request):
+        """This method resolves a list of schema names and versions or iris
+        and returns every export, or the errors of each item"""
+        messages = []
+        items = request.data
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if not isinstance(items, list) or \
+                not all(isinstance(item, dict) for item in items):
+            messages.append("Error; request body must be a JSON array of "
+                            "objects with 'name' and 'version' or 'iri'")
             logger.error(messages)
             return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
         try:
-            serializer_class = TermSetSerializer(queryset[0])
-            logger.info(queryset[0])
-            # only way messages gets sent is if there was
-            # an error serializing or in the response process.
-            messages.append(
-                "Error fetching records please check the logs.")
-            return Response(serializer_class.data,
-                            status.HTTP_200_OK)
-        except ObjectDoesNotExist:
-            errorMsg = {
-                "message": messages
-            }
+            results = self._resolve(items)
+            snapshots = get_snapshots(
+                [result for result in results
+                 if isinstance(result, TermSet)])
+            renderer = JSONRenderer()
+            parts = [schema_content(result, snapshots[result.iri])
+                     if isinstance(result, TermSet)
+                     else renderer.render({'message': result})
+                     for result in results]
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        content = b'{"results":[' + b','.join(parts) + b']}'
+        return HttpResponse(content, content_type='application/json',
+                            status=status.HTTP_200_OK)
+
+    def _resolve(self, items):
+        """Return the Term Set, or the list of error messages, of every
+        item using one query for the names and one for the iris"""
+        names = {str(item['name']) for item in items if item.get('name')}
+        iris = {str(item['iri']) for item in items
+                if not item.get('name') and item.get('iri')}
+
+        # every version of each name, latest first
+        versions = defaultdict(list)
+        if names:
+            for term_set in self.get_queryset().filter(
+                    name__in=names).order_by('name', *TermSet.LATEST_VERSION):
+                versions[term_set.name].append(term_set)
+        by_iri = self.get_queryset().in_bulk(iris) if iris else {}
+
+        results = []
+        for item in items:
+            name = str(item.get('name') or '')
+            version = str(item.get('version') or '')
+            iri = str(item.get('iri') or '')
+
+            if name:
+                matches = [term_set for term_set in versions[name]
+                           if not version or term_set.version == version]
+                if not versions[name]:
+                    results.append(["Error; no schema found with the "
+                                    "name '" + name + "'"])
+                elif not matches:
+                    results.append(["Error; no schema found for version '" +
+                                    version + "'"])
+                else:
+                    results.append(matches[0])
+            elif iri:
+                if iri in by_iri:
+                    results.append(by_iri[iri])
+                else:
+                    results.append(["Error; no schema found with the iri '" +
+                                    iri + "'"])
+            else:
+                results.append(["Error; 'name' or 'iri' is required"])
+        return results
+
+
+class SchemaDiffDataView(GenericAPIView):
+    """Handles HTTP requests for the differences between schema versions"""
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def get(self, request):
+        """This method returns the Terms added, removed and changed between
+        two versions of a schema"""
+        messages = []
+        name = request.GET.get('name')
+        from_version = request.GET.get('fromVersion')
+        to_version = request.GET.get('toVersion')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if not name or not from_version or not to_version:
+            messages.append("Error; query parameters 'name', 'fromVersion' "
+                            "and 'toVersion' are required")
+            logger.error(messages)
             return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
-        except HTTPError as http_err:
-            logger.error(http_err)
+
+        iris = {version: 'xss:' + version + '@' + name.replace(' ', '_')
+                for version in (from_version, to_version)}
+        roots = self.get_queryset().in_bulk(iris.values())
+        for version, iri in iris.items():
+            if iri not in roots:
+                messages.append("Error; no schema found for version '" +
+                                version + "'")
+        if messages:
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        old = roots[iris[from_version]]
+        new = roots[iris[to_version]]
+        try:
+            return conditional_response(
+                request, [old, new], lambda: Response(
+                    {'name': old.name, 'from': old.iri, 'to': new.iri,
+                     **get_diff(old, new)}, status.HTTP_200_OK))
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class TermSearchDataView(GenericAPIView):
+    """Handles HTTP requests to search the Terms of every schema"""
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def get(self, request):
+        """This method returns the Terms matching a query, best first"""
+        messages = []
+        query = request.GET.get('q', '')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if not query.strip():
+            messages.append("Error; query parameter 'q' is required")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = min(int(request.GET.get('limit', SEARCH_LIMIT)),
+                        MAX_SEARCH_LIMIT)
+            if limit < 1:
+                raise ValueError()
+        except ValueError:
+            messages.append("Error; query parameter 'limit' must be a "
+                            "positive number")
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            results = search_terms(
+                query, status=request.GET.get('status', 'published'),
+                data_type=request.GET.get('data_type'),
+                schema=request.GET.get('schema'),
+                name=request.GET.get('name'), limit=limit)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(
+            {
+                'query': query,
+                'results': [{'iri': term.iri,
+                             'name': term.name,
+                             'path': term.path,
+                             'schema': term.root_id,
+                             'status': term.status,
+                             'score': score,
+                             **term.export()} for term, score in results]
+            }, status.HTTP_200_OK)
+
+
+class TermMappingDataView(GenericAPIView):
+    """Handles HTTP requests for the Terms mapped to a Term or Term Set"""
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def get(self, request):
+        """This method returns every Term mapped to the Terms below an iri,
+        across all schemas"""
+        messages = []
+        iri = request.GET.get('iri')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if not iri:
+            messages.append("Error; query parameter 'iri' is required")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            mapped = mapped_terms(iri, request.GET.get('status',
+                                                       'published'))
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
             return Response(errorMsg,
                             status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({'iri': iri, 'mappings': mapped}, status.HTTP_200_OK)
+
+
+class SchemaCatalogDataView(GenericAPIView):
+    """Handles HTTP requests to the catalog of schemas"""
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def get(self, request):
+        """This method lists the root Term Sets in name and version order,
+        one page after a cursor at a time"""
+        messages = []
+        cursor = request.GET.get('cursor')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        try:
+            limit = min(int(request.GET.get('limit', CATALOG_LIMIT)),
+                        MAX_CATALOG_LIMIT)
+            if limit < 1:
+                raise ValueError()
+            roots, has_more = catalog_page(
+                cursor, request.GET.get('name'), request.GET.get('status'),
+                limit)
+        except ValueError:
+            messages.append("Error; query parameters 'cursor' or 'limit' "
+                            "are not valid")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
         except Exception as err:
             logger.error(err)
+            messages.append("Error fetching records please check the logs.")
             return Response(errorMsg,
                             status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        return Response(
+            {
+                'results': [{'iri': root.iri,
+                             'name': root.name,
+                             'version': root.version,
+                             'status': root.status,
+                             'term_set_count': root.term_set_count,
+                             'term_count': root.term_count,
+                             'modified': root.modified}
+                            for root in roots],
+                'next_cursor': encode_catalog_cursor(roots[-1]) if roots
+                else cursor,
+                'has_more': has_more
+            }, status.HTTP_200_OK)
+
+
+class ChangeFeedDataView(GenericAPIView):
+    """Handles HTTP requests to the feed of changes"""
+    queryset = TermSet.objects.all().filter(status='published')
+
+    def get(self, request):
+        """This method returns the changes made after a cursor or a point
+        in time, oldest first"""
+        messages = []
+        cursor = request.GET.get('cursor')
+        since = request.GET.get('since')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        try:
+            limit = min(int(request.GET.get('limit', CHANGE_LIMIT)),
+                        MAX_CHANGE_LIMIT)
+            if limit < 1:
+                raise ValueError()
+            if since:
+                since = parse_datetime(since)
+                if since is None:
+                    raise ValueError()
+            events, has_more = changes_since(
+                cursor, since, request.GET.get('kind'), limit)
+        except ValueError:
+            messages.append("Error; query parameters 'cursor', 'since' or "
+                            "'limit' are not valid")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(
+            {
+                'results': [{'kind': event.kind,
+                             'action': event.action,
+                             'iri': event.iri,
+                             'root': event.root,
+                             'related': event.related,
+                             'status': event.status,
+                             'modified': event.modified}
+                            for event in events],
+                # clients keep the last cursor to resume from
+                'next_cursor': encode_cursor(events[-1]) if events
+                else cursor,
+                'has_more': has_more
+            }, status.HTTP_200_OK)
+
 
 class TransformationLedgerDataView(GenericAPIView):
     """Handles HTTP requests to the Transformation Ledger"""
@@ -143,10 +550,18 @@ class TransformationLedgerDataView(GenericAPIView):
                     source_name, source_version, source_iri, messages)
                 target_qs = self._filter_by_target(
                     target_name, target_version, target_iri, messages)
-                mapping_dict = target_qs.first().mapped_to(source_qs.first()
-                                                           .iri)
+                source = source_qs.first()
+                target = target_qs.first()
                 messages.append(
                     "Error fetching records please check the logs.")
+                response = conditional_response(
+                    request, [source, target], lambda: Response(
+                        {
+                            'source': source.iri,
+                            'target': target.iri,
+                            'schema_mapping': TermSetTree(target).mapped_to(
+                                source.iri)
+                        }, status.HTTP_200_OK))
             except ObjectDoesNotExist:
                 errorMsg = {
                     "message": messages
@@ -161,12 +576,7 @@ class TransformationLedgerDataView(GenericAPIView):
                 return Response(errorMsg,
                                 status.HTTP_500_INTERNAL_SERVER_ERROR)
             else:
-                return Response(
-                    {
-                        'source': source_qs.first().iri,
-                        'target': target_qs.first().iri,
-                        'schema_mapping': mapping_dict
-                    }, status.HTTP_200_OK)
+                return response
         else:
             logger.error(messages)
             return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
@@ -187,7 +597,7 @@ class TransformationLedgerDataView(GenericAPIView):
         if source_name:
             # look for a model with the provided name
             queryset = self.get_queryset().filter(name=source_name)
-            if not queryset:
+            if not queryset.exists():
                 messages.append("Error; no source schema found "
                                 "with the name '" + source_name + "'")
                 raise ObjectDoesNotExist()
@@ -195,16 +605,15 @@ class TransformationLedgerDataView(GenericAPIView):
             # if the schema name is found, filter for the version.
             # If no version is provided, we fetch the latest version
             if not source_version:
-                term_sets = [ts for ts in queryset]
-                term_set = sort_version(term_sets, reverse_order=True)[0]
-                queryset = queryset.filter(iri=term_set.iri)
+                queryset = queryset.order_by(*TermSet.LATEST_VERSION)
             else:
                 queryset = queryset.filter(version=source_version)
-            if not queryset:
-                messages.append(
-                    "Error; no source schema found for version '" +
-                    source_version + "'")
-                raise ObjectDoesNotExist()
+
+                if not queryset:
+                    messages.append(
+                        "Error; no source schema found for version '" +
+                        source_version + "'")
+                    raise ObjectDoesNotExist()
         elif source_iri:
             # look for a model with the provided iri
             queryset = self.get_queryset().filter(iri=source_iri)
@@ -222,7 +631,7 @@ class TransformationLedgerDataView(GenericAPIView):
             # look for a model with the provided name
             queryset = queryset.filter(name=target_name)
 
-            if not queryset:
+            if not queryset.exists():
                 messages. \
                     append("Error; no target schema found "
                            "with the name '" + target_name + "'")
@@ -231,17 +640,15 @@ class TransformationLedgerDataView(GenericAPIView):
             # if the schema name is found, filter for the version.
             # If no version is provided, we fetch the latest version
             if not target_version:
-                term_sets = [ts for ts in queryset]
-                term_set = sort_version(term_sets, reverse_order=True)[0]
-                queryset = queryset.filter(iri=term_set.iri)
+                queryset = queryset.order_by(*TermSet.LATEST_VERSION)
             else:
                 queryset = queryset.filter(version=target_version)
 
-            if not queryset:
-                messages.append(
-                    "Error; no target schema found for version '" +
-                    target_version + "'")
-                raise ObjectDoesNotExist()
+                if not queryset:
+                    messages.append(
+                        "Error; no target schema found for version '" +
+                        target_version + "'")
+                    raise ObjectDoesNotExist()
 
         elif target_iri:
             # look for a model with the provided name
@@ -252,3 +659,298 @@ class TransformationLedgerDataView(GenericAPIView):
                                 "with the iri '" + target_iri + "'")
                 raise ObjectDoesNotExist()
         return queryset
+
+
+class MappingBatchDataView(TransformationLedgerDataView):
+    """Handles HTTP requests for the mappings of several schema pairs"""
+    http_method_names = ['post', 'options']
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """This method returns the mappings of a list of source and target
+        pairs, or of every published source of a single target"""
+        messages = []
+        body = request.data
+
+        errorMsg = {
+            "message": messages
+        }
+
+        try:
+            if isinstance(body, dict):
+                pairs = self._target_pairs(body, messages)
+            elif isinstance(body, list) and \
+                    all(isinstance(item, dict) for item in body):
+                pairs = self._resolve_pairs(body)
+            else:
+                messages.append("Error; request body must be a JSON array "
+                                "of source and target pairs or a JSON "
+                                "object with the target")
+                logger.error(messages)
+                return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+            results = self._mappings(pairs)
+        except ObjectDoesNotExist:
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response({'results': results}, status.HTTP_200_OK)
+
+    def _target_pairs(self, body, messages):
+        """Pair a target with every source mapped to it by a published
+        Transformation Ledger"""
+        if not body.get('targetName') and not body.get('targetIRI'):
+            messages.append("Error; query parameter 'targetName' or "
+                            "'targetIRI' is required")
+            raise ObjectDoesNotExist()
+
+        target = self._filter_by_target(
+            body.get('targetName'), body.get('targetVersion'),
+            body.get('targetIRI'), messages).first()
+        sources = self.get_queryset().filter(
+            source_mapping__target_schema=target,
+            source_mapping__status='published').distinct().order_by('iri')
+        return [(source, target) for source in sources]
+
+    def _resolve_pairs(self, items):
+        """Resolve the source and target of every item, looking up each
+        distinct set of parameters only once"""
+        resolved = {}
+
+        def resolve(lookup, name, version, iri):
+            key = (lookup.__name__, name, version, iri)
+            if key not in resolved:
+                messages = []
+                try:
+                    resolved[key] = lookup(name, version, iri,
+                                           messages).first()
+                except ObjectDoesNotExist:
+                    resolved[key] = messages
+            return resolved[key]
+
+        pairs = []
+        for item in items:
+            messages = self._check_params(
+                item.get('sourceName'), item.get('sourceIRI'),
+                item.get('targetName'), item.get('targetIRI'))
+            if messages:
+                pairs.append(messages)
+                continue
+
+            source = resolve(self._filter_by_source, item.get('sourceName'),
+                             item.get('sourceVersion'),
+                             item.get('sourceIRI'))
+            target = resolve(self._filter_by_target, item.get('targetName'),
+                             item.get('targetVersion'),
+                             item.get('targetIRI'))
+            errors = [result for result in (source, target)
+                      if isinstance(result, list)]
+            pairs.append(sum(errors, []) if errors else (source, target))
+        return pairs
+
+    def _mappings(self, pairs):
+        """Build the mapping dict of every pair, loading each target tree
+        once for all of its sources"""
+        sources = defaultdict(set)
+        targets = {}
+        for pair in pairs:
+            if isinstance(pair, tuple):
+                sources[pair[1].iri].add(pair[0].iri)
+                targets[pair[1].iri] = pair[1]
+
+        mapped = {iri: TermSetTree(target).mapped_to_many(
+                  sorted(sources[iri])) for iri, target in targets.items()}
+
+        return [{'source': pair[0].iri,
+                 'target': pair[1].iri,
+                 'schema_mapping': mapped[pair[1].iri][pair[0].iri]}
+                if isinstance(pair, tuple) else {'message': pair}
+                for pair in pairs]
+
+
+class ComposedMappingDataView(TransformationLedgerDataView):
+    """Handles HTTP requests for mappings composed through other schemas"""
+
+    def get(self, request):
+        """This method returns the mapping from a source to a target schema
+        following the shortest chain of Transformation Ledgers"""
+        source_name = request.GET.get('sourceName')
+        source_iri = request.GET.get('sourceIRI')
+        target_name = request.GET.get('targetName')
+        target_iri = request.GET.get('targetIRI')
+        source_version = request.GET.get('sourceVersion')
+        target_version = request.GET.get('targetVersion')
+
+        messages = self._check_params(
+            source_name, source_iri, target_name, target_iri)
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if messages:
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            source = self._filter_by_source(
+                source_name, source_version, source_iri, messages).first()
+            target = self._filter_by_target(
+                target_name, target_version, target_iri, messages).first()
+            path, generations = find_mapping_path(source.iri, target.iri)
+            if path is None:
+                messages.append("Error; no chain of mappings found from '" +
+                                source.iri + "' to '" + target.iri + "'")
+                raise ObjectDoesNotExist()
+            mapping = get_composed_mapping(path, generations)
+        except ObjectDoesNotExist:
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error fetching records please check the logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(
+            {
+                'source': source.iri,
+                'target': target.iri,
+                'path': path,
+                'schema_mapping': mapping
+            }, status.HTTP_200_OK)
+
+
+def read_records(request):
+    """Read a batch of records from a JSON array or NDJSON request body"""
+    if request.content_type.split(';')[0].strip() == NDJSON:
+        records = [json.loads(line) for line in
+                   request.body.decode('utf-8').splitlines() if line.strip()]
+    else:
+        records = request.data
+
+    if not isinstance(records, list) or \
+            not all(isinstance(record, dict) for record in records):
+        raise ValueError("records must be a list of JSON objects")
+    return records
+
+
+class TransformationDataView(TransformationLedgerDataView):
+    """Handles HTTP requests to transform records with stored mappings"""
+    http_method_names = ['post', 'options']
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """This method transforms a batch of records from the source
+        schema into the target schema"""
+        source_name = request.GET.get('sourceName')
+        source_iri = request.GET.get('sourceIRI')
+        target_name = request.GET.get('targetName')
+        target_iri = request.GET.get('targetIRI')
+        source_version = request.GET.get('sourceVersion')
+        target_version = request.GET.get('targetVersion')
+
+        messages = self._check_params(
+            source_name, source_iri, target_name, target_iri)
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if len(messages) != 0:
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            records = read_records(request)
+        except (ParseError, ValueError):
+            messages.append("Error; request body must be a JSON array or "
+                            "NDJSON of record objects")
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            source = self._filter_by_source(
+                source_name, source_version, source_iri, messages).first()
+            target = self._filter_by_target(
+                target_name, target_version, target_iri, messages).first()
+            plan = get_plan(source, target)
+            if plan is None:
+                messages.append("Error; no chain of mappings found from '" +
+                                source.iri + "' to '" + target.iri + "'")
+                raise ObjectDoesNotExist()
+            transformed = plan.transform_all(records)
+        except ObjectDoesNotExist:
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error transforming records please check the "
+                            "logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if request.content_type.split(';')[0].strip() == NDJSON:
+            content = ''.join(json.dumps(record) + '\n'
+                              for record in transformed)
+            return HttpResponse(content, content_type=NDJSON,
+                                status=status.HTTP_200_OK)
+        return Response(
+            {
+                'source': source.iri,
+                'target': target.iri,
+                'records': transformed
+            }, status.HTTP_200_OK)
+
+
+class ValidationDataView(SchemaLedgerDataView):
+    """Handles HTTP requests to validate records against a schema"""
+    http_method_names = ['post', 'options']
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        """This method validates a batch of records against a schema and
+        returns the errors found in each record"""
+        messages = []
+        name = request.GET.get('name')
+        version = request.GET.get('version')
+        iri = request.GET.get('iri')
+
+        errorMsg = {
+            "message": messages
+        }
+
+        if not name and not iri:
+            messages.append("Error; query parameter 'name' or 'iri'"
+                            " is required")
+            logger.error(messages)
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            records = read_records(request)
+        except (ParseError, ValueError):
+            messages.append("Error; request body must be a JSON array or "
+                            "NDJSON of record objects")
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+
+        try:
+            term_set = self._filter_schema(
+                name, version, iri, messages).first()
+            errors = get_validator(term_set).validate_all(records)
+        except ObjectDoesNotExist:
+            return Response(errorMsg, status.HTTP_400_BAD_REQUEST)
+        except Exception as err:
+            logger.error(err)
+            messages.append("Error validating records please check the "
+                            "logs.")
+            return Response(errorMsg,
+                            status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return Response(
+            {
+                'iri': term_set.iri,
+                'valid': sum(1 for error in errors if not error),
+                'invalid': sum(1 for error in errors if error),
+                'errors': errors
+            }, status.HTTP_200_OK)
@@ -1,22 +1,40 @@
 from django.contrib import admin
 
-from core.models import (ChildTermSet, SchemaLedger, Term, TermSet,
-                         TransformationLedger)
+from core.management.utils.job_utils import retry_job
+from core.models import (ChildTermSet, IngestionJob, SchemaLedger, Term,
+                         TermSet, TransformationLedger)
+
+
+def latest_job(obj):
+    """Show the state and progress of the newest ingestion job"""
+    jobs = sorted(obj.jobs.all(), key=lambda job: job.created)
+    if not jobs:
+        return '-'
+    job = jobs[-1]
+    return f'{job.state} ({job.terms_processed} terms)'
+
+
+latest_job.short_description = 'Ingestion'
 
 
 # Register your models here.
 @admin.register(SchemaLedger)
 class SchemaLedgerAdmin(admin.ModelAdmin):
     """Admin form for the SchemaLedger model"""
-    list_display = ('schema_name', 'status', 'version',)
+    list_display = ('schema_name', 'status', 'version', latest_job,)
     fields = [('schema_name', 'schema_file', 'status',),
-              ('major_version', 'minor_version', 'patch_version',)]
+              ('major_version', 'minor_version', 'patch_version',),
+              ('reuse_previous_version',)]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('jobs')
 
     def get_readonly_fields(self, request, obj=None):
         if obj:  # editing an existing object
             return self.readonly_fields + ('schema_name', 'schema_file',
                                            'major_version', 'minor_version',
-                                           'patch_version')
+                                           'patch_version',
+                                           'reuse_previous_version')
         return self.readonly_fields
 
     def save_model(self, request, obj, form, change):
@@ -27,10 +45,14 @@ class SchemaLedgerAdmin(admin.ModelAdmin):
 @admin.register(TransformationLedger)
 class TransformationLedgerAdmin(admin.ModelAdmin):
     """Admin form for the TransformationLedger model"""
-    list_display = ('id', 'source_schema', 'target_schema', 'status',)
+    list_display = ('id', 'source_schema', 'target_schema', 'status',
+                    latest_job,)
     fields = [('source_schema', 'target_schema',),
               ('schema_mapping_file', 'status',)]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('jobs')
+
     # Override the foreign key fields to show the name and version in the
     # admin form instead of the ID
     def get_form(self, request, obj=None, **kwargs):
@@ -89,12 +111,13 @@ class TermAdmin(admin.ModelAdmin):
     list_display = ('iri', 'status', 'term_set', 'updated_by',
                     'modified', )
     fieldsets = (
-        (None, {'fields': ('iri', 'name', 'uuid', 'description', 'status',)}),
+        (None, {'fields': ('iri', 'name', 'path', 'uuid', 'description',
+                           'status',)}),
         ('Info', {'fields': ('data_type', 'use', 'source',)}),
         ('Connections', {'fields': ('term_set', 'mapping',)}),
         ('Updated', {'fields': ('updated_by',), })
     )
-    readonly_fields = ('iri', 'updated_by', 'modified', 'uuid',)
+    readonly_fields = ('iri', 'path', 'updated_by', 'modified', 'uuid',)
     filter_horizontal = ('mapping',)
     search_fields = ['iri', ]
     list_filter = ('status', ('term_set', admin.RelatedOnlyFieldListFilter))
@@ -108,5 +131,29 @@ class TermAdmin(admin.ModelAdmin):
         form = super(TermAdmin, self).get_form(request, obj, **kwargs)
         if obj is not None:
             form.base_fields['mapping'].queryset = Term.objects.exclude(
-                iri__startswith=obj.root_term_set())
+                root=obj.root_term_set())
         return form
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(admin.ModelAdmin):
+    """Admin form for the Ingestion Job model"""
+    list_display = ('id', 'kind', 'state', 'schema_ledger',
+                    'transformation_ledger', 'term_sets_processed',
+                    'terms_processed', 'duration', 'modified',)
+    readonly_fields = ('kind', 'state', 'schema_ledger',
+                       'transformation_ledger', 'term_sets_processed',
+                       'terms_processed', 'started', 'finished', 'duration',
+                       'message',)
+    list_filter = ('state', 'kind',)
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected failed jobs')
+    def retry_jobs(self, request, queryset):
+        jobs = list(queryset.filter(state='failed'))
+        for job in jobs:
+            retry_job(job)
+        self.message_user(request, f'{len(jobs)} jobs queued again')
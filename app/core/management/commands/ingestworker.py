@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.utils import DatabaseError
+
+from core.management.utils.job_utils import claim_job, run_job
+
+
+class Command(BaseCommand):
+    """This command runs queued schema ingestion and mapping jobs"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='exit once the queue is empty')
+        parser.add_argument('--sleep', type=int, default=5,
+                            help='seconds to wait when the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            # the database drops connections left idle between jobs
+            close_old_connections()
+            try:
+                job = claim_job()
+            except DatabaseError as err:
+                self.stdout.write(self.style.ERROR(
+                    f"Could not claim an ingestion job: {err}"))
+                time.sleep(options['sleep'])
+                continue
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            try:
+                run_job(job)
+            except DatabaseError as err:
+                # the job is reclaimed once it stops making progress
+                self.stdout.write(self.style.ERROR(
+                    f"Job {job.pk} interrupted: {err}"))
+                continue
+            self.stdout.write(
+                f"Job {job.pk} {job.state} in {job.duration}")
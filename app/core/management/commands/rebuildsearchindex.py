@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.management.utils.search_utils import index_term_set
+from core.models import TermSearchToken, TermSet
+
+
+class Command(BaseCommand):
+    """This command rebuilds the term search index of every schema"""
+
+    def handle(self, *args, **options):
+        roots = TermSet.objects.filter(childtermset__isnull=True).order_by(
+            'iri')
+
+        for root in roots.iterator():
+            index_term_set(root)
+            self.stdout.write(f"Indexed {root.iri}")
+
+        self.stdout.write(
+            f"{TermSearchToken.objects.count()} search tokens indexed")
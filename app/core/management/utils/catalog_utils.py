@@ -0,0 +1,70 @@
+import base64
+import json
+import logging
+
+from django.db.models import F, Q
+
+from core.models import ChildTermSet, Term, TermSet
+
+logger = logging.getLogger('dict_config_logger')
+
+CATALOG_LIMIT = 100
+MAX_CATALOG_LIMIT = 1000
+# catalog order, backed by the name/version index
+CATALOG_ORDER = ('name', 'major_version', 'minor_version', 'patch_version')
+
+
+def refresh_counts(root_iri):
+    """function to recount the Term Sets and Terms below a root"""
+    TermSet.objects.filter(iri=root_iri).update(
+        term_set_count=ChildTermSet.objects.filter(root=root_iri).count(),
+        term_count=Term.objects.filter(root=root_iri).count())
+
+
+def count_change(model, delta):
+    """Build the update of the count of model rows below a root"""
+    field = 'term_count' if model is Term else 'term_set_count'
+    return {field: F(field) + delta}
+
+
+def encode_catalog_cursor(term_set):
+    """Build the opaque cursor following a root Term Set"""
+    position = json.dumps([getattr(term_set, field)
+                           for field in CATALOG_ORDER])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_catalog_cursor(cursor):
+    """Read the position of a root Term Set back from its cursor"""
+    try:
+        name, major, minor, patch = json.loads(
+            base64.urlsafe_b64decode(cursor.encode()).decode())
+        return str(name), int(major), int(minor), int(patch)
+    except (ValueError, TypeError, UnicodeError) as err:
+        raise ValueError(f"invalid cursor {cursor}") from err
+
+
+def catalog_page(cursor=None, name=None, status=None, limit=CATALOG_LIMIT):
+    """function to page through the root Term Sets in name and version
+    order after a cursor"""
+    roots = TermSet.objects.filter(childtermset__isnull=True).only(
+        'iri', 'name', 'version', 'major_version', 'minor_version',
+        'patch_version', 'status', 'term_set_count', 'term_count',
+        'modified').order_by(*CATALOG_ORDER)
+
+    if name:
+        roots = roots.filter(name__startswith=name)
+    if status:
+        roots = roots.filter(status=status)
+    if cursor:
+        name, major, minor, patch = decode_catalog_cursor(cursor)
+        # keyset pagination over the name/version index
+        roots = roots.filter(
+            Q(name__gt=name) |
+            Q(name=name, major_version__gt=major) |
+            Q(name=name, major_version=major, minor_version__gt=minor) |
+            Q(name=name, major_version=major, minor_version=minor,
+              patch_version__gt=patch))
+
+    page = list(roots[:limit + 1])
+    return page[:limit], len(page) > limit
@@ -0,0 +1,84 @@
+import base64
+import logging
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from core.models import (ChangeEvent, ChildTermSet, SchemaLedger, Term,
+                         TermSet, TransformationLedger)
+
+logger = logging.getLogger('dict_config_logger')
+
+CHANGE_LIMIT = 100
+MAX_CHANGE_LIMIT = 1000
+
+
+def record_change(kind, action, iri, root='', related='', status=''):
+    """function to add an event to the change feed"""
+    return ChangeEvent.objects.create(kind=kind, action=action, iri=iri,
+                                      root=root or '',
+                                      related=related or '',
+                                      status=status or '')
+
+
+def record_instance_change(instance, action):
+    """function to add the event of a saved or deleted row"""
+    if isinstance(instance, ChildTermSet):
+        return record_change('term_set', action, instance.iri,
+                             root=instance.root_id, status=instance.status)
+    if isinstance(instance, TermSet):
+        return record_change('term_set', action, instance.iri,
+                             root=instance.iri, status=instance.status)
+    if isinstance(instance, Term):
+        return record_change('term', action, instance.iri,
+                             root=instance.root_id, status=instance.status)
+    if isinstance(instance, SchemaLedger):
+        return record_change('schema_ledger', action, instance.schema_iri,
+                             root=instance.schema_iri,
+                             status=instance.status)
+    if isinstance(instance, TransformationLedger):
+        return record_change('transformation_ledger', action,
+                             str(instance.uuid),
+                             root=instance.target_schema_id,
+                             related=instance.source_schema_id,
+                             status=instance.status)
+    return None
+
+
+def encode_cursor(event):
+    """Build the opaque cursor following an event"""
+    position = f'{event.modified.isoformat()}|{event.pk}'
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Read the position of an event back from its cursor"""
+    try:
+        modified, pk = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split('|')
+        modified = parse_datetime(modified)
+        pk = int(pk)
+    except (ValueError, UnicodeError) as err:
+        raise ValueError(f"invalid cursor {cursor}") from err
+    if modified is None:
+        raise ValueError(f"invalid cursor {cursor}")
+    return modified, pk
+
+
+def changes_since(cursor=None, since=None, kind=None, limit=CHANGE_LIMIT):
+    """function to page through the change feed in (modified, id) order
+    after a cursor or a point in time"""
+    events = ChangeEvent.objects.order_by('modified', 'id')
+
+    if cursor:
+        modified, pk = decode_cursor(cursor)
+        # keyset pagination over the (modified, id) index
+        events = events.filter(Q(modified__gt=modified) |
+                               Q(modified=modified, id__gt=pk))
+    elif since is not None:
+        events = events.filter(modified__gt=since)
+    if kind:
+        events = events.filter(kind=kind)
+
+    page = list(events[:limit + 1])
+    return page[:limit], len(page) > limit
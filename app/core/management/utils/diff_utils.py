@@ -0,0 +1,45 @@
+import logging
+
+from django.core.cache import cache
+
+from core.models import Term
+
+logger = logging.getLogger('dict_config_logger')
+
+DIFF_TIMEOUT = 60 * 60 * 24
+
+
+def diff_term_sets(old, new):
+    """function to compare the Terms of two root Term Sets by path"""
+    terms = {old.iri: {}, new.iri: {}}
+    for term in Term.objects.filter(
+            root__in=[old, new], status='published').only(
+            'root', 'path', 'use', 'data_type', 'source',
+            'description').order_by('path'):
+        terms[term.root_id][term.path] = term.export()
+
+    old_terms = terms[old.iri]
+    new_terms = terms[new.iri]
+    return {
+        'added': {path: attrs for path, attrs in new_terms.items()
+                  if path not in old_terms},
+        'removed': {path: attrs for path, attrs in old_terms.items()
+                    if path not in new_terms},
+        'changed': {path: {'from': old_terms[path], 'to': attrs}
+                    for path, attrs in new_terms.items()
+                    if path in old_terms and old_terms[path] != attrs},
+    }
+
+
+def get_diff(old, new):
+    """function to fetch the cached diff of two versions of a schema"""
+    # the generations change whenever either tree changes
+    key = f'xss:diff:{old.iri}:{old.generation}:{new.iri}:{new.generation}'
+    diff = cache.get(key)
+
+    if diff is None:
+        diff = diff_term_sets(old, new)
+        cache.set(key, diff, DIFF_TIMEOUT)
+        logger.info(f"Computed diff from {old.iri} to {new.iri}")
+
+    return diff
@@ -0,0 +1,663 @@
+import logging
+
+import ijson
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import (CharField, DateTimeField, F, Func,
+                              IntegerField, Q, UUIDField, Value)
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+
+from core.management.utils.catalog_utils import refresh_counts
+from core.management.utils.search_utils import index_term_set, index_terms
+from core.management.utils.snapshot_utils import build_snapshot
+from core.models import (ChildTermSet, IngestionJob, SchemaLedger, Term,
+                         TermSearchToken, TermSet)
+
+logger = logging.getLogger('dict_config_logger')
+
+TERM_FIELDS = {field.attname for field in Term._meta.concrete_fields}
+CONTAINERS = {'start_map': 'end_map', 'start_array': 'end_array'}
+# attributes of a Term copied into the next version of its schema
+CLONED_FIELDS = ('use', 'data_type', 'source', 'description')
+# unchanged Term Sets copied by each INSERT ... SELECT
+COPY_CHUNK_SIZE = 100
+
+
+def element_kind(value):
+    """Classify an element of uploaded metadata by its first sub value"""
+    if not isinstance(value, dict) or not value:
+        return None
+    first = next(iter(value.values()))
+    # If Json Field value is a Nested Json
+    if isinstance(first, dict):
+        return 'termset'
+    # If Json Field value is a string
+    if isinstance(first, str):
+        return 'term'
+    return None
+
+
+class SchemaIngestor:
+    """
+    Collects the Child Term Sets and Terms of an uploaded schema in memory
+    and writes them with batched inserts
+    """
+
+    def __init__(self, root, status, updated_by, batch_size=1000,
+                 progress=None):
+        self.root = root
+        self.status = status
+        self.updated_by = updated_by
+        self.batch_size = batch_size
+        # called with the ingestor after every written batch
+        self.progress = progress
+        self.term_sets = []
+        self.terms = []
+        self.term_set_count = 0
+        self.term_count = 0
+
+    def add_term_set(self, name, parent):
+        """Queue a Child Term Set below parent and return it"""
+        child = ChildTermSet(parent_term_set=parent, name=name,
+                             status=self.status,
+                             updated_by=self.updated_by)
+        child.generate_iri()
+        child.termset_ptr_id = child.iri
+        self.term_sets.append(child)
+        self.term_set_count += 1
+        if len(self.term_sets) >= self.batch_size:
+            self.flush()
+
+        return child
+
+    def add_term(self, term_obj, name, parent):
+        """Queue a Term below parent and return it"""
+        term = Term(term_set=parent, name=name, status=self.status,
+                    updated_by=self.updated_by)
+        for key, value in term_obj.items():
+            if key in TERM_FIELDS:
+                setattr(term, key, value)
+        term.generate_iri()
+        self.terms.append(term)
+        self.term_count += 1
+        if len(self.terms) >= self.batch_size:
+            self.flush()
+
+        return term
+
+    def ingest(self, metadata, parent=None):
+        """Walk the uploaded metadata, queueing a row for every element"""
+        parent = parent or self.root
+
+        # Check every key elements value in data
+        for element, value in metadata.items():
+            kind = element_kind(value)
+            if kind == 'termset':
+                child = self.add_term_set(element, parent)
+                self.ingest(value, child)
+            elif kind == 'term':
+                self.add_term(value, element, parent)
+
+    def flush(self):
+        """Write every queued row, Term Sets before the Terms below them"""
+        if self.term_sets:
+            TermSet.objects.bulk_create(
+                [TermSet(**{field.attname: getattr(child, field.attname)
+                            for field in TermSet._meta.concrete_fields})
+                 for child in self.term_sets])
+            insert_child_rows(self.term_sets)
+            self.term_sets = []
+        if self.terms:
+            Term.objects.bulk_create(self.terms)
+            self.terms = []
+        if self.progress is not None:
+            self.progress(self)
+
+    def index(self):
+        """Add the search tokens of every ingested Term"""
+        index_term_set(self.root)
+
+
+class StreamingSchemaIngestor(SchemaIngestor):
+    """
+    Schema ingestor fed from the parser events of an uploaded file, so the
+    schema is never held in memory and batches are written while parsing
+    """
+
+    def ingest_file(self, json_file):
+        """Parse the uploaded file, queueing a row for every element"""
+        events = ijson.basic_parse(json_file, use_float=True)
+        event, _ = next(events)
+        if event != 'start_map':
+            raise ValueError("uploaded schema must be a JSON object")
+        self._members(events, self.root)
+
+    def _members(self, events, parent):
+        """Ingest the members of an object up to its end_map"""
+        for event, value in events:
+            if event == 'end_map':
+                return
+            self._member(events, value, next(events), parent)
+
+    def _member(self, events, element, first, parent):
+        """Ingest one member, classified like SchemaIngestor.ingest() by
+        the first value inside it"""
+        event, _ = first
+        # values that are not Nested Json are ignored
+        if event != 'start_map':
+            skip(events, event)
+            return
+
+        event, sub_element = next(events)
+        if event == 'end_map':
+            return
+        first = next(events)
+        event, value = first
+
+        if event == 'start_map':
+            child = self.add_term_set(element, parent)
+            self._member(events, sub_element, first, child)
+            self._members(events, child)
+        elif event == 'string':
+            # Terms are small, so each one is built whole
+            builder = ijson.ObjectBuilder()
+            builder.event('start_map', None)
+            builder.event('map_key', sub_element)
+            builder.event(event, value)
+            depth = 1
+            for event, value in events:
+                builder.event(event, value)
+                if event in CONTAINERS:
+                    depth += 1
+                elif event in CONTAINERS.values():
+                    depth -= 1
+                    if depth == 0:
+                        break
+            self.add_term(builder.value, element, parent)
+        else:
+            skip(events, event)
+            skip(events, 'start_map')
+
+
+class RandomUUID(Func):
+    """Random uuid generated by the database for every row, in the format
+    UUIDField stores it"""
+    output_field = UUIDField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        raise NotSupportedError(
+            f"random uuids are not supported on {connection.vendor}")
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return "REPLACE(UUID(), '-', '')", []
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return 'LOWER(HEX(RANDOMBLOB(16)))', []
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return 'GEN_RANDOM_UUID()', []
+
+
+def copy_rows(model, queryset, values):
+    """Insert a copy of every row of queryset into the table of model with
+    a single INSERT ... SELECT, computing the columns in values in the
+    database, and return the number of rows"""
+    opts = model._meta
+    fields = [field for field in opts.local_concrete_fields
+              if field is not opts.auto_field]
+    select = queryset.annotate(**{
+        'copy_' + field.column: values.get(field.attname,
+                                           F(field.attname))
+        for field in fields}).values_list(
+        *('copy_' + field.column for field in fields))
+    sql, params = select.query.sql_with_params()
+    qn = connection.ops.quote_name
+
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO %s (%s) %s' % (
+            qn(opts.db_table),
+            ', '.join(qn(field.column) for field in fields), sql), params)
+        return cursor.rowcount
+
+
+def expected_rows(metadata, path=''):
+    """Return the paths of the Term Sets, and the paths and attributes of
+    the Terms, that ingesting metadata creates"""
+    term_sets, terms = set(), {}
+    for element, value in metadata.items():
+        kind = element_kind(value)
+        name = element.replace(' ', '_')
+        child_path = path + '.' + name if path else name
+        if kind == 'termset':
+            term_sets.add(child_path)
+            sub_sets, sub_terms = expected_rows(value, child_path)
+            term_sets |= sub_sets
+            terms.update(sub_terms)
+        elif kind == 'term':
+            terms[child_path] = tuple(value.get(field, '' if field == 'use'
+                                                else None)
+                                      for field in CLONED_FIELDS)
+    return term_sets, terms
+
+
+class VersionIngestor(SchemaIngestor):
+    """
+    Schema ingestor for a new version of a schema, which copies the rows
+    of unchanged elements from the tree of the previous version with
+    INSERT ... SELECT statements, and the mappings of every Term that
+    carries over
+    """
+
+    def __init__(self, root, status, updated_by, previous, batch_size=1000,
+                 progress=None):
+        super().__init__(root, status, updated_by, batch_size, progress)
+        self.previous = previous
+        # paths of the previous elements whose rows differ from the
+        # metadata, and of every Term Set above them
+        self.stale = set()
+        # paths of the Term Sets copied with everything below them, and of
+        # the Terms copied on their own
+        self.copied_term_sets = []
+        self.copied_terms = []
+        self.cloned_count = 0
+
+    def compare(self, metadata):
+        """Find the rows of the previous tree that do not match its
+        metadata, being retired, missing, added or edited since"""
+        expected_sets, expected_terms = expected_rows(metadata)
+        term_sets = dict(ChildTermSet.objects.filter(
+            root=self.previous).values_list('path', 'status'))
+        terms = {path: (status, attrs) for path, status, *attrs in
+                 Term.objects.filter(root=self.previous).values_list(
+                     'path', 'status', *CLONED_FIELDS)}
+
+        # rows retired on their own no longer share the status of the root
+        root_status = self.previous.status
+        stale = expected_sets.symmetric_difference(term_sets)
+        stale.update(path for path, status in term_sets.items()
+                     if status != root_status)
+        stale.update(expected_terms.keys() ^ terms.keys())
+        stale.update(path for path, (status, attrs) in terms.items()
+                     if status != root_status or
+                     tuple(attrs) != expected_terms.get(path))
+
+        for path in stale:
+            steps = path.split('.')
+            self.stale.update('.'.join(steps[:depth])
+                              for depth in range(1, len(steps) + 1))
+
+    def ingest_diff(self, metadata, old, parent=None, path=''):
+        """Walk the new metadata next to the previous one, marking equal
+        elements to copy and queueing the inserted and changed ones"""
+        parent = parent or self.root
+        old = old if isinstance(old, dict) else {}
+
+        for element, value in metadata.items():
+            kind = element_kind(value)
+            old_value = old.get(element)
+            name = element.replace(' ', '_')
+            child_path = path + '.' + name if path else name
+            unchanged = value == old_value and child_path not in self.stale
+
+            if kind == 'termset':
+                if unchanged:
+                    self.copied_term_sets.append(child_path)
+                else:
+                    child = self.add_term_set(element, parent)
+                    if element_kind(old_value) != 'termset':
+                        old_value = {}
+                    self.ingest_diff(value, old_value, child, child_path)
+            elif kind == 'term':
+                if unchanged:
+                    self.copied_terms.append(child_path)
+                else:
+                    self.add_term(value, element, parent)
+
+    def moved(self, field):
+        """Build the iri in field moved from the previous root to the new
+        one"""
+        return Concat(Value(self.root.iri),
+                      Substr(field, len(self.previous.iri) + 1),
+                      output_field=CharField())
+
+    def copy(self):
+        """Copy the rows of the unchanged elements, and their search
+        tokens, once the rows above them are written"""
+        self.flush()
+
+        for chunk in chunks(self.copied_term_sets, COPY_CHUNK_SIZE):
+            copy_rows(TermSet, TermSet.objects.filter(
+                subtrees(chunk, 'childtermset__'),
+                childtermset__root=self.previous), {
+                    **self.row_values(),
+                    'version': Value(self.root.version),
+                    'major_version': Value(self.root.major_version),
+                    'minor_version': Value(self.root.minor_version),
+                    'patch_version': Value(self.root.patch_version)})
+            self.term_set_count += copy_rows(
+                ChildTermSet, ChildTermSet.objects.filter(
+                    subtrees(chunk), root=self.previous), {
+                    'termset_ptr_id': self.moved('termset_ptr_id'),
+                    'parent_term_set_id': self.moved('parent_term_set_id'),
+                    'root_id': Value(self.root.iri)})
+            self.copy_terms(subtrees(chunk, include_top=False))
+
+        for chunk in chunks(self.copied_terms, COPY_CHUNK_SIZE):
+            self.copy_terms(Q(path__in=chunk))
+
+        if self.progress is not None:
+            self.progress(self)
+
+    def copy_all(self):
+        """Copy every row of the previous tree"""
+        self.copied_term_sets = list(ChildTermSet.objects.filter(
+            parent_term_set=self.previous).values_list('path', flat=True))
+        self.copied_terms = list(Term.objects.filter(
+            term_set=self.previous).values_list('path', flat=True))
+        self.copy()
+
+    def copy_terms(self, paths):
+        """Copy the previous Terms whose path matches paths, and their
+        search tokens"""
+        terms = Term.objects.filter(paths, root=self.previous)
+        copied = copy_rows(Term, terms, {
+            **self.row_values(),
+            'term_set_id': self.moved('term_set_id'),
+            'root_id': Value(self.root.iri)})
+        copy_rows(TermSearchToken, TermSearchToken.objects.filter(
+            term__in=terms), {'term_id': self.moved('term_id')})
+        self.term_count += copied
+        self.cloned_count += copied
+
+    def row_values(self):
+        """Build the columns of a copied Term Set or Term that differ from
+        the previous version"""
+        now = Value(timezone.now(), output_field=DateTimeField())
+        return {'iri': self.moved('iri'),
+                'uuid': RandomUUID(),
+                'status': Value(self.status),
+                'updated_by_id': Value(getattr(self.updated_by, 'pk', None),
+                                       output_field=IntegerField()),
+                'created': now,
+                'modified': now}
+
+    def copy_mappings(self):
+        """Link the Terms found at the same path in both versions to
+        everything the previous one was mapped to, returning the number of
+        links"""
+        previous = self.previous.iri
+        links = Term.mapping.through.objects.filter(
+            Q(from_term__root=previous) |
+            Q(to_term__root=previous)).values_list(
+            'from_term_id', 'from_term__root', 'to_term_id', 'to_term__root')
+        new_terms = set(Term.objects.filter(root=self.root).values_list(
+            'iri', flat=True))
+
+        def moved(iri, root):
+            # links inside the previous tree follow it to the new version
+            if root != previous:
+                return iri
+            iri = self.root.iri + iri[len(previous):]
+            return iri if iri in new_terms else None
+
+        rows = set()
+        for from_iri, from_root, to_iri, to_root in links:
+            from_iri = moved(from_iri, from_root)
+            to_iri = moved(to_iri, to_root)
+            if from_iri is not None and to_iri is not None:
+                rows.add((from_iri, to_iri))
+
+        through = Term.mapping.through
+        through.objects.bulk_create(
+            [through(from_term_id=from_iri, to_term_id=to_iri)
+             for from_iri, to_iri in rows],
+            batch_size=self.batch_size, ignore_conflicts=True)
+
+        return len(rows) // 2
+
+    def index(self):
+        """Add the search tokens of the Terms that were not copied"""
+        index_terms(Term.objects.filter(
+            root=self.root, search_tokens__isnull=True).only(
+            'iri', 'name', 'path', 'description').iterator())
+
+
+def subtrees(paths, prefix='', include_top=True):
+    """Build the filter of the rows below the Term Sets at paths"""
+    below = Q()
+    for path in paths:
+        if include_top:
+            below |= Q(**{prefix + 'path': path})
+        below |= Q(**{prefix + 'path__startswith': path + '.'})
+    return below
+
+
+def chunks(items, size):
+    """Yield successive lists of at most size items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def skip(events, event):
+    """Consume the rest of a value whose first event has been read"""
+    if event not in CONTAINERS:
+        return
+    depth = 1
+    for event, _ in events:
+        if event in CONTAINERS:
+            depth += 1
+        elif event in CONTAINERS.values():
+            depth -= 1
+            if depth == 0:
+                return
+
+
+def insert_child_rows(children):
+    """Insert the ChildTermSet table rows of already created TermSets"""
+    # bulk_create does not support multi-table inheritance, so the child
+    # table rows are written with a single executemany
+    opts = ChildTermSet._meta
+    fields = opts.local_concrete_fields
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(opts.db_table), ', '.join(qn(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)))
+
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(getattr(child, field.attname),
+                                    connection) for field in fields]
+            for child in children])
+
+
+def ingest_metadata(metadata, termset, status, updated_by, progress=None):
+    """function to create every Term Set and Term of a schema in bulk"""
+    ingestor = SchemaIngestor(termset, status, updated_by,
+                              progress=progress)
+
+    with transaction.atomic():
+        ingestor.ingest(metadata)
+        ingestor.flush()
+
+    logger.info(f"Ingested {ingestor.term_set_count} Term Sets and "
+                f"{ingestor.term_count} Terms into {termset.iri}")
+
+    return ingestor
+
+
+def ingest_upload(json_file, termset, status, updated_by, progress=None):
+    """function to create every Term Set and Term of an uploaded schema
+    file while it is parsed"""
+    ingestor = StreamingSchemaIngestor(termset, status, updated_by,
+                                       progress=progress)
+
+    with transaction.atomic():
+        with json_file.open('rb') as stream:
+            ingestor.ingest_file(stream)
+        ingestor.flush()
+
+    logger.info(f"Streamed {ingestor.term_set_count} Term Sets and "
+                f"{ingestor.term_count} Terms into {termset.iri}")
+
+    return ingestor
+
+
+def stream_mapping(json_file):
+    """Yield (target path, source path) for every leaf of an uploaded
+    mapping file, like flatten_mapping()"""
+    # keys of the enclosing objects, with None for arrays which
+    # flatten_mapping() does not descend into
+    path = []
+    with json_file.open('rb') as stream:
+        for event, value in ijson.basic_parse(stream, use_float=True):
+            if event == 'map_key':
+                path[-1] = value.replace(' ', '_')
+            elif event in CONTAINERS:
+                path.append('' if event == 'start_map' else None)
+            elif event in CONTAINERS.values():
+                path.pop()
+            elif event == 'string' and path and None not in path:
+                yield '.'.join(path), '.'.join(
+                    step.replace(' ', '_') for step in value.split('.'))
+
+
+def previous_version(ledger):
+    """function to find the ledger and Term Set of the version of a schema
+    before the given ledger, if its metadata can be compared"""
+    major = ledger.major_version
+    minor = ledger.minor_version
+    previous = SchemaLedger.objects.filter(
+        Q(major_version__lt=major) |
+        Q(major_version=major, minor_version__lt=minor) |
+        Q(major_version=major, minor_version=minor,
+          patch_version__lt=ledger.patch_version),
+        schema_name=ledger.schema_name).order_by(
+        '-major_version', '-minor_version', '-patch_version').first()
+
+    # schemas uploaded as large files have no metadata to compare
+    if previous is None or not previous.metadata:
+        return None
+    termset = TermSet.objects.filter(iri=previous.schema_iri).first()
+    if termset is None:
+        return None
+
+    return previous, termset
+
+
+def duplicate_version(ledger):
+    """function to find the Term Set of another version of a schema with
+    the same content as the given ledger, whose rows are still the ones
+    ingested from it"""
+    if not ledger.content_hash:
+        return None
+    duplicates = SchemaLedger.objects.filter(
+        schema_name=ledger.schema_name,
+        content_hash=ledger.content_hash).exclude(pk=ledger.pk).values_list(
+        'schema_iri', flat=True)
+
+    for termset in TermSet.objects.filter(iri__in=duplicates).order_by(
+            *TermSet.LATEST_VERSION):
+        if as_ingested(termset):
+            return termset
+    return None
+
+
+def as_ingested(termset):
+    """function to check that no row of the tree of a Term Set was added,
+    deleted, retired or edited on its own since it was ingested"""
+    job = IngestionJob.objects.filter(
+        kind='schema', state='succeeded',
+        schema_ledger__schema_iri=termset.iri).order_by(
+        '-finished').values_list('finished', 'term_sets_processed',
+                                 'terms_processed').first()
+    # trees ingested before jobs were recorded cannot be checked
+    if job is None:
+        return False
+    finished, term_set_count, term_count = job
+    if (termset.term_set_count, termset.term_count) != \
+            (term_set_count, term_count):
+        return False
+
+    edited = ~Q(status=termset.status) | Q(modified__gt=finished)
+    return not ChildTermSet.objects.filter(edited, root=termset).exists() \
+        and not Term.objects.filter(edited, root=termset).exists()
+
+
+def clone_version(termset, duplicate, status, updated_by, progress=None):
+    """function to create the Term Set tree of a schema by copying the
+    tree, and mappings, of a version with the same content"""
+    ingestor = VersionIngestor(termset, status, updated_by, duplicate,
+                               progress=progress)
+
+    with transaction.atomic():
+        ingestor.copy_all()
+        links = ingestor.copy_mappings()
+
+    logger.info(f"Cloned {ingestor.term_count} Terms and {links} mappings "
+                f"from {duplicate.iri} into {termset.iri}")
+
+    return ingestor
+
+
+def ingest_version(metadata, termset, previous, status, updated_by,
+                   progress=None):
+    """function to create the Term Set tree of a new version of a schema
+    from the tree of the previous version"""
+    previous_ledger, previous_termset = previous
+    ingestor = VersionIngestor(termset, status, updated_by,
+                               previous_termset, progress=progress)
+
+    with transaction.atomic():
+        ingestor.compare(previous_ledger.metadata)
+        ingestor.ingest_diff(metadata, previous_ledger.metadata)
+        ingestor.copy()
+        links = ingestor.copy_mappings()
+
+    logger.info(f"Copied {ingestor.cloned_count} of {ingestor.term_count} "
+                f"Terms and {links} mappings from {previous_termset.iri} "
+                f"into {termset.iri}")
+
+    return ingestor
+
+
+def ingest_schema(ledger, progress=None):
+    """function to create the Term Set tree of a Schema Ledger, calling
+    progress with the ingestor after every written batch"""
+    with transaction.atomic():
+        termset = TermSet.objects.create(name=ledger.schema_name,
+                                         version=ledger.version,
+                                         status=ledger.status,
+                                         updated_by=ledger.updated_by)
+
+        # identical uploads are copied without walking the metadata
+        duplicate = duplicate_version(ledger)
+        previous = None
+        if ledger.reuse_previous_version and not ledger.schema_file:
+            previous = previous_version(ledger)
+
+        if duplicate is not None:
+            ingestor = clone_version(termset, duplicate, ledger.status,
+                                     ledger.updated_by, progress)
+        elif previous is not None:
+            ingestor = ingest_version(ledger.metadata, termset, previous,
+                                      ledger.status, ledger.updated_by,
+                                      progress)
+        # large uploads are kept as files and parsed while ingesting
+        elif ledger.schema_file:
+            ingestor = ingest_upload(ledger.schema_file, termset,
+                                     ledger.status, ledger.updated_by,
+                                     progress)
+        else:
+            ingestor = ingest_metadata(ledger.metadata, termset,
+                                       ledger.status, ledger.updated_by,
+                                       progress)
+
+        ingestor.index()
+        refresh_counts(termset.iri)
+
+    if termset.status == 'published':
+        build_snapshot(termset)
+
+    logger.info("TermSet created")
+
+    return ingestor
@@ -0,0 +1,166 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.management.utils.change_utils import record_change
+from core.management.utils.ingest_utils import ingest_schema, stream_mapping
+from core.management.utils.signals_utils import termset_map
+from core.management.utils.snapshot_utils import touch_term_set
+from core.models import IngestionJob
+
+logger = logging.getLogger('dict_config_logger')
+
+# runs of a job before a worker stops reclaiming it
+MAX_JOB_ATTEMPTS = 3
+
+
+class JobProgress:
+    """
+    Callback storing the counters of a running job after every batch of
+    rows, which also shows the job is alive. Batches are written inside
+    the ingestion transaction, so a job run by the worker stores its
+    counters through a connection of its own to be seen while it is open.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.connection = None
+        # SQLite only allows one writer at a time, and a job created
+        # inside a transaction, as synchronous uploads in the admin are,
+        # has a row other connections wait on until it is committed
+        if connection.vendor != 'sqlite' and \
+                not connection.in_atomic_block:
+            self.connection = connections.create_connection(
+                DEFAULT_DB_ALIAS)
+
+    def __call__(self, ingestor):
+        self.job.term_sets_processed = ingestor.term_set_count
+        self.job.terms_processed = ingestor.term_count
+        fields = {'term_sets_processed': ingestor.term_set_count,
+                  'terms_processed': ingestor.term_count,
+                  'modified': timezone.now()}
+
+        if self.connection is None:
+            IngestionJob.objects.filter(pk=self.job.pk).update(**fields)
+            return
+
+        opts = IngestionJob._meta
+        qn = self.connection.ops.quote_name
+        sql = 'UPDATE %s SET %s WHERE %s = %%s' % (
+            qn(opts.db_table),
+            ', '.join('%s = %%s' % qn(opts.get_field(name).column)
+                      for name in fields),
+            qn(opts.pk.column))
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, [
+                opts.get_field(name).get_db_prep_save(value, self.connection)
+                for name, value in fields.items()] + [self.job.pk])
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def enqueue_job(kind, **ledger):
+    """function to queue an ingestion job, running it now if not async"""
+    job = IngestionJob.objects.create(kind=kind, **ledger)
+
+    if not settings.ASYNC_INGESTION:
+        run_job(job, raise_errors=True)
+
+    return job
+
+
+def claim_job():
+    """function to take the oldest pending job off the queue, or a running
+    job whose worker stopped making progress"""
+    kwargs = {}
+    if connection.features.has_select_for_update_skip_locked:
+        kwargs['skip_locked'] = True
+    stale = timezone.now() - timedelta(
+        seconds=settings.INGESTION_JOB_TIMEOUT)
+
+    with transaction.atomic():
+        abandoned = IngestionJob.objects.filter(state='running',
+                                                modified__lt=stale)
+        abandoned.filter(attempts__gte=MAX_JOB_ATTEMPTS).update(
+            state='failed', finished=timezone.now(),
+            message=f'abandoned by its worker {MAX_JOB_ATTEMPTS} times')
+
+        job = IngestionJob.objects.select_for_update(**kwargs).filter(
+            Q(state='pending') |
+            Q(state='running', modified__lt=stale)).order_by(
+            'created').first()
+        if job is not None:
+            if job.state == 'running':
+                logger.warning(f"Reclaimed ingestion job {job.pk} "
+                               f"abandoned by its worker")
+            job.state = 'running'
+            job.save(update_fields=['state', 'modified'])
+
+    return job
+
+
+def retry_job(job):
+    """function to queue a failed job again, running it now if not
+    async"""
+    job.state = 'pending'
+    job.attempts = 0
+    job.message = ''
+    job.save(update_fields=['state', 'attempts', 'message', 'modified'])
+
+    if not settings.ASYNC_INGESTION:
+        run_job(job)
+
+    return job
+
+
+def run_job(job, raise_errors=False):
+    """function to run an ingestion job and record its outcome"""
+    job.state = 'running'
+    job.started = timezone.now()
+    job.attempts += 1
+    job.save(update_fields=['state', 'started', 'attempts', 'modified'])
+    progress = JobProgress(job)
+
+    try:
+        if job.kind == 'schema':
+            ingestor = ingest_schema(job.schema_ledger, progress)
+            job.term_sets_processed = ingestor.term_set_count
+            job.terms_processed = ingestor.term_count
+            # the rows of the tree are written in bulk, without signals
+            record_change('tree', 'created', ingestor.root.iri,
+                          root=ingestor.root.iri,
+                          status=ingestor.root.status)
+        else:
+            ledger = job.transformation_ledger
+            # large uploads are kept as files and parsed while mapping
+            if ledger.schema_mapping_file:
+                mapping = stream_mapping(ledger.schema_mapping_file)
+            else:
+                mapping = ledger.schema_mapping
+            job.terms_processed = termset_map(ledger.target_schema,
+                                              ledger.source_schema, mapping)
+            touch_term_set(ledger.target_schema_id)
+            record_change('mapping', 'created', ledger.target_schema_id,
+                          root=ledger.target_schema_id,
+                          related=ledger.source_schema_id,
+                          status=ledger.status)
+        job.state = 'succeeded'
+    except Exception as err:
+        logger.error(f"Ingestion job {job.pk} failed: {err}")
+        job.state = 'failed'
+        job.message = str(err)
+        if raise_errors:
+            raise
+    finally:
+        progress.close()
+        job.finished = timezone.now()
+        job.duration = job.finished - job.started
+        job.save()
+
+    return job
@@ -0,0 +1,123 @@
+import logging
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+
+from core.models import Term, TermSearchToken
+
+logger = logging.getLogger('dict_config_logger')
+
+TOKEN_LENGTH = TermSearchToken._meta.get_field('token').max_length
+# weight of a token by the Term field it was found in
+NAME_WEIGHT = 3
+PATH_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+
+
+def tokenize(text):
+    """Split text into lower case tokens, adding the parts of camel case
+    words such as CourseTitle"""
+    tokens = []
+    for word in re.findall(r'[^\W_]+', text or ''):
+        tokens.append(word.lower()[:TOKEN_LENGTH])
+        parts = re.findall('[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+', word)
+        if len(parts) > 1:
+            tokens.extend(part.lower()[:TOKEN_LENGTH] for part in parts)
+    return tokens
+
+
+def term_tokens(term):
+    """Return the highest weight of every token of a Term"""
+    weights = {}
+    for text, weight in ((term.description, DESCRIPTION_WEIGHT),
+                         (term.path, PATH_WEIGHT),
+                         (term.name, NAME_WEIGHT)):
+        for token in tokenize(text):
+            weights[token] = max(weight, weights.get(token, 0))
+    return weights
+
+
+def index_terms(terms, batch_size=1000):
+    """function to add the search tokens of Terms to the index"""
+    batch = []
+    for term in terms:
+        batch.extend(TermSearchToken(token=token, term_id=term.iri,
+                                     weight=weight)
+                     for token, weight in term_tokens(term).items())
+        if len(batch) >= batch_size:
+            TermSearchToken.objects.bulk_create(batch)
+            batch = []
+    TermSearchToken.objects.bulk_create(batch)
+
+
+def index_term_set(root):
+    """function to rebuild the search tokens of every Term of a root Term
+    Set"""
+    TermSearchToken.objects.filter(term__root=root).delete()
+    index_terms(Term.objects.filter(root=root).only(
+        'iri', 'name', 'path', 'description').iterator())
+
+
+def index_term(term):
+    """function to rebuild the search tokens of a single Term"""
+    TermSearchToken.objects.filter(term=term).delete()
+    index_terms([term])
+
+
+def search_terms(query, status='published', data_type=None, schema=None,
+                 name=None, limit=SEARCH_LIMIT):
+    """
+    function to find the Terms matching every token of a query, ranked by
+    the weight of the fields they matched in. Tokens ending in * match as
+    prefixes.
+    """
+    wanted = []
+    for word in query.split():
+        tokens = [token.lower()[:TOKEN_LENGTH]
+                  for token in re.findall(r'[^\W_]+', word)]
+        wanted.extend((token, False) for token in tokens[:-1])
+        # only the end of a word can be a prefix
+        if tokens:
+            wanted.append((tokens[-1], word.endswith('*')))
+    if not wanted:
+        return []
+
+    condition = Q()
+    for token, prefix in wanted:
+        condition |= Q(token__startswith=token) if prefix else \
+            Q(token=token)
+    matches = TermSearchToken.objects.filter(condition)
+    if status:
+        matches = matches.filter(term__status=status)
+    if data_type:
+        matches = matches.filter(term__data_type=data_type)
+    if schema:
+        matches = matches.filter(term__root=schema)
+    if name:
+        matches = matches.filter(term__root__name=name)
+
+    # best weight of every query token in every matching Term, with exact
+    # matches ranked above prefix matches
+    scores = defaultdict(dict)
+    for term_iri, token, weight in matches.values_list(
+            'term_id', 'token', 'weight'):
+        for index, (wanted_token, prefix) in enumerate(wanted):
+            if token == wanted_token:
+                score = weight * 2
+            elif prefix and token.startswith(wanted_token):
+                score = weight
+            else:
+                continue
+            scores[term_iri][index] = max(score,
+                                          scores[term_iri].get(index, 0))
+
+    ranked = sorted(((sum(found.values()), term_iri)
+                     for term_iri, found in scores.items()
+                     if len(found) == len(wanted)),
+                    key=lambda match: (-match[0], match[1]))[:limit]
+
+    terms = Term.objects.in_bulk([term_iri for _, term_iri in ranked])
+    return [(terms[term_iri], score) for score, term_iri in ranked]
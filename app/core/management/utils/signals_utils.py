@@ -1,6 +1,9 @@
 import logging
 
-from core.models import ChildTermSet, Term, TermSet
+from django.db.models import Q
+
+from core.management.utils.tree_utils import below
+from core.models import ChildTermSet, Term, TermSet, iri_path
 
 logger = logging.getLogger('dict_config_logger')
 
@@ -58,64 +61,75 @@ def term_object(term_obj, term_name, parent_iri, status, updated_by):
 
 def update_status(termset, status, updated_by):
     """function to update the status of children terms/termsets"""
+    # every descendant iri starts with the term set iri followed by / for
+    # term sets or ? for terms, so two UPDATEs cover the whole subtree
+    descendants = Q(iri__startswith=termset.iri + '/')
+
+    TermSet.objects.filter(descendants).update(status=status,
+                                               updated_by=updated_by)
+    Term.objects.filter(
+        descendants | Q(iri__startswith=termset.iri + '?')).update(
+        status=status, updated_by=updated_by)
+
 
-    child_termset = ChildTermSet.objects.filter(parent_term_set=termset)
+def flatten_mapping(mapping, prefix=''):
+    """Yield (target path, source path) for every leaf of a mapping dict"""
+    for kid, value in mapping.items():
+        target_path = prefix + kid.replace(' ', '_')
+        # if the value in the dict is a string, the key is the term
+        if isinstance(value, str):
+            yield target_path, '.'.join(
+                step.replace(' ', '_') for step in value.split('.'))
+        # else the key is a child term set
+        elif isinstance(value, dict):
+            yield from flatten_mapping(value, target_path + '.')
 
-    if child_termset:
-        for child_element in child_termset:
-            child_termset.update(status=status, updated_by=updated_by)
-            update_status(child_element, status, updated_by)
-    term = termset.terms
-    term.update(status=status, updated_by=updated_by)
+
+def terms_by_path(term_set):
+    """Return the iri of every Term below a Term Set, which may be a root
+    or a Child Term Set, by its dotted path from that Term Set"""
+    root = term_set.root_term_set()
+    start = len(iri_path(term_set.iri, root)) + 1 if term_set.iri != root \
+        else 0
+    return {path[start:]: iri for path, iri in below(
+        Term.objects, term_set.iri).values_list('path', 'iri')}
 
 
 def termset_map(target, source, mapping):
     """
-    recursive function to create mappings between schemas
+    function to create mappings between schemas in bulk
     """
-    for kid in mapping:
-        # if the value in the dict is a string, the key is the term
-        if isinstance(mapping[kid], str):
-            path = mapping[kid].split('.')
-            source_ts = TermSet.objects.get(iri=source.iri)
-
-            try:
-                # traverse the source term sets
-                for step in path[:-1]:
-                    source_ts = source_ts.children.get(
-                        name=step.replace(' ', '_'))
-            except Exception:
-                # if one of the child term sets doesn't exist, log and
-                # skip to the next mapping
-                logger.info(f"Source Term Set {mapping[kid]} does not exist")
-                continue
-
-            source_name = path[-1].replace(' ', '_')
-            target_name = kid.replace(' ', '_')
-
-            # verify terms exist
-            if not target.terms.filter(name=target_name).exists():
-                logger.info(f"Target Term {target_name} does not exist")
-                continue
-            if not source_ts.terms.filter(name=source_name).exists():
-                logger.info(f"Source Term {source_name} does not exist")
-                continue
-
-            # get the terms
-            source_term = source_ts.terms.get(name=source_name)
-            target_term = target.terms.get(name=target_name)
-
-            # add the term connection
-            target_term.mapping.add(source_term)
-            target_term.save()
-
-        # if kid is not a child of target, log and skip to next mapping
-        elif not target.children.filter(name=kid.replace(' ', '_')).exists():
-            logger.info(
-                f"Target Term Set {kid} does not exist in {target.iri}")
+    # index every Term of both trees by its dotted path
+    target_terms = terms_by_path(target)
+    source_terms = terms_by_path(source)
+
+    links = []
+    skipped = []
+    # mappings of large uploads arrive already flattened
+    if isinstance(mapping, dict):
+        mapping = flatten_mapping(mapping)
+
+    for target_path, source_path in mapping:
+        target_iri = target_terms.get(target_path)
+        source_iri = source_terms.get(source_path)
+
+        # verify terms exist
+        if target_iri is None or source_iri is None:
+            skipped.append(f"{target_path} -> {source_path}")
             continue
-
-        # else the key is a child term set
-        else:
-            termset_map(target.children.get(
-                name=kid.replace(' ', '_')), source, mapping[kid])
+        links.append((target_iri, source_iri))
+
+    # the mapping is symmetrical, so store the link in both directions
+    through = Term.mapping.through
+    through.objects.bulk_create(
+        [through(from_term_id=from_iri, to_term_id=to_iri)
+         for target_iri, source_iri in links
+         for from_iri, to_iri in ((target_iri, source_iri),
+                                  (source_iri, target_iri))],
+        ignore_conflicts=True)
+
+    if skipped:
+        logger.info(f"Skipped {len(skipped)} mappings from {source.iri} to "
+                    f"{target.iri} with missing Terms: {', '.join(skipped)}")
+
+    return len(links)
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.management.utils.tree_utils import TermSetTree
+from core.models import TermSet, TermSetSnapshot
+
+logger = logging.getLogger('dict_config_logger')
+
+
+def render_snapshot(term_set):
+    """function to serialize the export of a Term Set without storing it"""
+    content = JSONRenderer().render(TermSetTree(term_set).export())
+
+    return TermSetSnapshot(term_set=term_set, content=content,
+                           size=len(content),
+                           sha256=hashlib.sha256(content).hexdigest())
+
+
+def build_snapshot(term_set):
+    """function to serialize and store the export of a root Term Set"""
+    # read before the tree, so that an export racing a change of the tree
+    # is stored under the generation before it and never served
+    generation = TermSet.objects.filter(iri=term_set.iri).values_list(
+        'generation', flat=True).get()
+    snapshot = render_snapshot(term_set)
+
+    snapshot, _ = TermSetSnapshot.objects.update_or_create(
+        term_set=term_set,
+        defaults={'content': snapshot.content,
+                  'size': snapshot.size,
+                  'sha256': snapshot.sha256,
+                  'generation': generation})
+    logger.info(f"Snapshot stored for {term_set.iri} ({snapshot.size} "
+                f"bytes)")
+
+    return snapshot
+
+
+def is_root(term_set):
+    """Return whether the Term Set is the root of its tree"""
+    return term_set.iri == term_set.root_term_set()
+
+
+def current_snapshots():
+    """Return the stored exports read at the current generation of their
+    Term Set"""
+    return TermSetSnapshot.objects.filter(
+        generation=F('term_set__generation'))
+
+
+def get_snapshot(term_set):
+    """function to fetch the stored export, building it if missing"""
+    # only roots are stored, the subtree of a Child Term Set is rendered
+    # from a fresh tree so that it never goes stale
+    if not is_root(term_set):
+        return render_snapshot(term_set)
+    try:
+        return current_snapshots().get(term_set=term_set)
+    except TermSetSnapshot.DoesNotExist:
+        return build_snapshot(term_set)
+
+
+def get_snapshots(term_sets):
+    """function to fetch the stored exports of several Term Sets at once,
+    keyed by iri"""
+    roots = [term_set for term_set in term_sets if is_root(term_set)]
+    snapshots = {snapshot.term_set_id: snapshot for snapshot in
+                 current_snapshots().filter(term_set__in=roots)}
+    for term_set in term_sets:
+        if term_set.iri not in snapshots:
+            snapshots[term_set.iri] = build_snapshot(term_set) \
+                if is_root(term_set) else render_snapshot(term_set)
+    return snapshots
+
+
+def refresh_snapshot(term_set):
+    """function to rebuild or drop a snapshot after a status change"""
+    if term_set.status == 'published':
+        touch_term_set(term_set.iri)
+        return build_snapshot(term_set)
+    invalidate_snapshot(term_set.iri)
+    return None
+
+
+def invalidate_snapshot(root_iri, **fields):
+    """function to drop the stored export of a root Term Set, also
+    updating fields of the root"""
+    # also drops exports of Child Term Sets stored by earlier releases
+    TermSetSnapshot.objects.filter(
+        Q(term_set=root_iri) |
+        Q(term_set__iri__startswith=root_iri + '/')).delete()
+    touch_term_set(root_iri, **fields)
+
+
+def touch_term_set(root_iri, **fields):
+    """function to mark the tree of a root Term Set as changed, also
+    updating fields of the root in the same statement"""
+    TermSet.objects.filter(iri=root_iri).update(
+        generation=F('generation') + 1, modified=timezone.now(), **fields)
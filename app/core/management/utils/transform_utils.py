@@ -0,0 +1,171 @@
+import hashlib
+import logging
+from collections import defaultdict, deque
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from core.management.utils.signals_utils import flatten_mapping
+from core.management.utils.tree_utils import TermSetTree
+from core.models import TermSet, TransformationLedger
+
+logger = logging.getLogger('dict_config_logger')
+
+PLAN_TIMEOUT = 60 * 60
+
+
+class TransformationPlan:
+    """
+    Compiled list of value copies that turns a record in the source schema
+    into a record in the target schema
+    """
+
+    def __init__(self, schema_mapping):
+        self.steps = [(target_path.split('.'), source_path.split('.'))
+                      for target_path, source_path in
+                      flatten_mapping(schema_mapping)]
+
+    def transform(self, record):
+        """Build the target record for one source record"""
+        result = {}
+        for target_path, source_path in self.steps:
+            value = record
+            for key in source_path:
+                if not isinstance(value, dict) or key not in value:
+                    break
+                value = value[key]
+            else:
+                node = result
+                for key in target_path[:-1]:
+                    node = node.setdefault(key, {})
+                node[target_path[-1]] = value
+        return result
+
+    def transform_all(self, records):
+        """Build the target records for a batch of source records"""
+        return [self.transform(record) for record in records]
+
+
+def plan_key(source, target):
+    # the generations change whenever either tree or its mappings change
+    return f'xss:plan:{source.iri}:{source.generation}:' \
+           f'{target.iri}:{target.generation}'
+
+
+def path_key(path, generations):
+    # the generations change whenever a schema or mapping on the path does
+    return hashlib.sha1(';'.join(
+        f'{iri}:{generations[iri]}' for iri in path).encode()).hexdigest()
+
+
+def ledgers_version():
+    """Return a fingerprint of the Transformation Ledgers, which changes
+    whenever one is added, deleted or edited"""
+    version = TransformationLedger.objects.aggregate(
+        count=Count('pk'), modified=Max('modified'))
+    return f"{version['count']}:{version['modified']}"
+
+
+def get_plan(source, target):
+    """function to fetch the compiled plan of a source and target pair,
+    composed through other schemas when they are not mapped directly, or
+    None when no chain of mappings joins them"""
+    # the generations of both ends are loaded already, so reusing a plan
+    # only checks the ledgers and the schemas in between
+    key = plan_key(source, target) + ':' + ledgers_version()
+    cached = cache.get(key)
+    if cached is not None:
+        plan, between = cached
+        if not between or dict(TermSet.objects.filter(
+                iri__in=between).values_list('iri', 'generation')) == \
+                between:
+            return plan
+
+    path, generations = find_mapping_path(source.iri, target.iri)
+    if path is None:
+        return None
+    if len(path) > 2:
+        plan = TransformationPlan(get_composed_mapping(path, generations))
+    else:
+        plan = TransformationPlan(TermSetTree(target).mapped_to(source.iri))
+    between = {iri: generations[iri] for iri in path[1:-1]}
+    cache.set(key, (plan, between), PLAN_TIMEOUT)
+    logger.info(f"Compiled transformation plan from {source.iri} to "
+                f"{target.iri} with {len(plan.steps)} steps")
+
+    return plan
+
+
+def find_mapping_path(source_iri, target_iri):
+    """function to find the shortest chain of published Transformation
+    Ledgers from a source to a target schema, with the generation of every
+    schema in the graph"""
+    edges = defaultdict(set)
+    generations = {}
+    for source, target, source_generation, target_generation in \
+            TransformationLedger.objects.filter(
+                status='published', source_schema__status='published',
+                target_schema__status='published').values_list(
+                'source_schema', 'target_schema',
+                'source_schema__generation', 'target_schema__generation'):
+        edges[source].add(target)
+        generations[source] = source_generation
+        generations[target] = target_generation
+
+    # breadth first search, so the first path found is the shortest
+    parents = {source_iri: None}
+    queue = deque([source_iri])
+    while queue:
+        iri = queue.popleft()
+        if iri == target_iri:
+            path = []
+            while iri is not None:
+                path.append(iri)
+                iri = parents[iri]
+            return path[::-1], generations
+        for kid in sorted(edges[iri]):
+            if kid not in parents:
+                parents[kid] = iri
+                queue.append(kid)
+
+    return None, generations
+
+
+def compose_mapping(path):
+    """function to build the mapping from the first to the last schema of
+    a path by following the mappings of every step"""
+    roots = TermSet.objects.in_bulk(path)
+    composed = None
+    for source, target in zip(path, path[1:]):
+        # target path -> source path of a single step
+        step = dict(flatten_mapping(
+            TermSetTree(roots[target]).mapped_to(source)))
+        if composed is None:
+            composed = step
+        else:
+            composed = {target_path: composed[source_path]
+                        for target_path, source_path in step.items()
+                        if source_path in composed}
+
+    # nest the dotted target paths like TermSetTree.mapped_to()
+    mapping = {}
+    for target_path, source_path in (composed or {}).items():
+        node = mapping
+        keys = target_path.split('.')
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = source_path
+    return mapping
+
+
+def get_composed_mapping(path, generations):
+    """function to fetch the cached composed mapping of a path"""
+    key = 'xss:composed:' + path_key(path, generations)
+    mapping = cache.get(key)
+
+    if mapping is None:
+        mapping = compose_mapping(path)
+        cache.set(key, mapping, PLAN_TIMEOUT)
+        logger.info(f"Composed mapping through {' -> '.join(path)}")
+
+    return mapping
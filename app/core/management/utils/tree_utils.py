@@ -0,0 +1,239 @@
+import logging
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.functions import Replace
+from rest_framework.renderers import JSONRenderer
+
+from core.models import ChildTermSet, Term, iri_path
+
+logger = logging.getLogger('dict_config_logger')
+
+
+def below(queryset, iri, prefix=''):
+    """Filter queryset to the rows below the Term Set at iri, which may be
+    a root or a Child Term Set"""
+    root_iri = iri.split('/')[0]
+    queryset = queryset.filter(**{prefix + 'root': root_iri})
+    if iri != root_iri:
+        path = iri_path(iri, root_iri)
+        queryset = queryset.filter(
+            **{prefix + 'path__startswith': path + '.'})
+    return queryset
+
+
+class TermSetTree:
+    """
+    In memory copy of a root Term Set and all of its descendants, loaded
+    with a fixed number of queries regardless of the depth or size of the
+    tree
+    """
+
+    def __init__(self, root, status='published'):
+        self.root = root
+        self.status = status
+        # parent term set iri -> list of child term sets
+        self.children = defaultdict(list)
+        # term set iri -> list of terms
+        self.terms = defaultdict(list)
+        self._load()
+
+    def _load(self):
+        """Fetch every descendant Child Term Set and Term of the root"""
+        child_qs = below(ChildTermSet.objects, self.root.iri).only(
+            'iri', 'name', 'status', 'parent_term_set').order_by('iri')
+        term_qs = below(Term.objects, self.root.iri).only(
+            'iri', 'name', 'use', 'data_type', 'source', 'description',
+            'status', 'term_set').order_by('iri')
+
+        if self.status is not None:
+            child_qs = child_qs.filter(status=self.status)
+            term_qs = term_qs.filter(status=self.status)
+
+        for kid in child_qs:
+            self.children[kid.parent_term_set_id].append(kid)
+        for term in term_qs:
+            self.terms[term.term_set_id].append(term)
+
+    def export(self, iri=None):
+        """Build the nested export dict of the Term Set at iri"""
+        iri = iri or self.root.iri
+        children = {kid.name: self.export(kid.iri)
+                    for kid in self.children[iri]}
+        terms = {term.name: term.export() for term in self.terms[iri]}
+        return {**children, **terms}
+
+    def mapped_to(self, source_root):
+        """Return dict of Terms mapped to anything in source_root string"""
+        return self.mapped_to_many([source_root])[source_root]
+
+    def mapped_to_many(self, source_roots):
+        """Return the mapping dict of every Term Set iri in source_roots"""
+        # sources below a Child Term Set only keep the paths under it
+        prefixes = defaultdict(list)
+        for source_root in source_roots:
+            root_iri = source_root.split('/')[0]
+            prefix = iri_path(source_root, root_iri) + '.' \
+                if source_root != root_iri else ''
+            prefixes[root_iri].append((source_root, prefix))
+
+        # one query over the mapping join table for every Term in the tree
+        links = below(Term.mapping.through.objects, self.root.iri,
+                      'from_term__').filter(
+            to_term__root__in=list(prefixes)).values_list(
+            'to_term__root', 'from_term_id',
+            'to_term__path').order_by('to_term_id')
+
+        mapped = {source_root: {} for source_root in source_roots}
+        for root_iri, target_iri, path in links:
+            for source_root, prefix in prefixes[root_iri]:
+                # keep the lowest source iri when a Term has several mappings
+                if path.startswith(prefix):
+                    mapped[source_root].setdefault(target_iri, path)
+
+        return {source_root: self._mapped(self.root.iri, terms)
+                for source_root, terms in mapped.items()}
+
+    def _mapped(self, iri, mapped):
+        """Build the nested mapping dict of the Term Set at iri"""
+        # filter out children with no mapped terms
+        children = {kid.name: self._mapped(kid.iri, mapped)
+                    for kid in self.children[iri]}
+        filtered_children = dict(
+            filter(lambda kid: len(kid[1]) != 0, children.items()))
+
+        # filter out terms that do not have a mapping
+        filtered_terms = {term.name: mapped[term.iri]
+                          for term in self.terms[iri] if term.iri in mapped}
+        return {**filtered_children, **filtered_terms}
+
+
+def mapped_terms(iri, status='published'):
+    """
+    Return the Terms mapped to the Term, Term Set or schema at iri, keyed
+    by the iri of each Term below it, from one query over the (root, path)
+    index and the mapping join table
+    """
+    root = iri.split('/')[0].split('?')[0]
+    links = Term.mapping.through.objects.filter(from_term__root=root)
+
+    if '?' in iri:
+        links = links.filter(from_term__path=iri_path(iri, root))
+    elif iri != root:
+        path = iri_path(iri, root)
+        links = links.filter(from_term__path__startswith=path + '.')
+    if status is not None:
+        links = links.filter(to_term__status=status)
+
+    mapped = defaultdict(list)
+    for term_iri, mapped_iri, mapped_root, mapped_path in links.values_list(
+            'from_term_id', 'to_term_id', 'to_term__root',
+            'to_term__path').order_by('from_term_id', 'to_term_id'):
+        mapped[term_iri].append({'iri': mapped_iri,
+                                 'schema': mapped_root,
+                                 'path': mapped_path})
+    return dict(mapped)
+
+
+def depth_first_key():
+    """Build the ordering key walking rows of a tree depth first"""
+    # both separators sort below every slug character, the one of Child
+    # Term Sets below the one of Terms, so that ordering by the key yields
+    # each Term Set with its whole subtree, then its own Terms
+    return Replace(Replace('iri', Value('/'), Value('\t')),
+                   Value('?'), Value(' '))
+
+
+class ExportStream:
+    """
+    Export JSON of the Term Set at iri yielded in pieces while walking its
+    Child Term Sets and Terms depth first. The Child Term Sets are read
+    first, then the Terms are streamed from a single query, so memory
+    follows the number of Term Sets rather than the size of the tree and
+    only one result set is ever open. The bytes match rendering
+    TermSetTree.export().
+    """
+
+    def __init__(self, iri, status='published'):
+        self.iri = iri
+        self.status = status
+        self.renderer = JSONRenderer()
+
+        child_qs = below(ChildTermSet.objects, iri).only(
+            'iri', 'name', 'parent_term_set')
+        self.term_qs = below(Term.objects, iri).only(
+            'iri', 'name', 'use', 'data_type', 'source', 'description',
+            'term_set')
+        # a Term replaces the value of a Child Term Set with the same name
+        shadow_qs = Term.objects.filter(term_set=OuterRef('parent_term_set'),
+                                        name=OuterRef('name'))
+
+        if status is not None:
+            child_qs = child_qs.filter(status=status)
+            self.term_qs = self.term_qs.filter(status=status)
+            shadow_qs = shadow_qs.filter(status=status)
+
+        # Child Term Sets of every exported Term Set, leaving out the
+        # subtrees of the Term Sets left out of the export or shadowed
+        self.children = {iri: []}
+        shadowed = Q()
+        # a Term Set sorts before everything below it
+        for kid in child_qs.annotate(
+                shadowed=Exists(shadow_qs),
+                key=depth_first_key()).order_by('key'):
+            if kid.parent_term_set_id not in self.children:
+                continue
+            self.children[kid.parent_term_set_id].append(kid)
+            if kid.shadowed:
+                shadowed |= Q(term_set=kid.parent_term_set_id,
+                              name=kid.name)
+            else:
+                self.children[kid.iri] = []
+
+        self.shadows = {}
+        if shadowed:
+            self.shadows = {(term.term_set_id, term.name): term
+                            for term in self.term_qs.filter(shadowed)}
+
+    def __iter__(self):
+        self.terms = self.term_qs.annotate(
+            key=depth_first_key()).order_by('key').iterator()
+        self.term = next(self.terms, None)
+        return self._term_set(self.iri)
+
+    def _term_set(self, iri):
+        """Yield the export of the Term Set at iri and its subtree"""
+        shadowed = set()
+        separator = b''
+
+        yield b'{'
+        for kid in self.children[iri]:
+            yield separator + self.renderer.render(kid.name) + b':'
+            if kid.shadowed:
+                shadowed.add(kid.name)
+                yield self.renderer.render(
+                    self.shadows[iri, kid.name].export())
+            else:
+                yield from self._term_set(kid.iri)
+            separator = b','
+
+        while self.term is not None:
+            term = self.term
+            if term.term_set_id == iri:
+                self.term = next(self.terms, None)
+                if term.name not in shadowed:
+                    yield separator + self.renderer.render(term.name) + \
+                        b':' + self.renderer.render(term.export())
+                    separator = b','
+            elif term.term_set_id not in self.children:
+                # below a Term Set left out of the export
+                self.term = next(self.terms, None)
+            else:
+                break
+
+        yield b'}'
+
+
+def stream_export(iri, status='published'):
+    """Yield the export JSON of the Term Set at iri in pieces"""
+    return iter(ExportStream(iri, status))
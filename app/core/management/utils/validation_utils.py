@@ -0,0 +1,124 @@
+import json
+import logging
+
+from django.core.cache import cache
+
+from core.management.utils.snapshot_utils import get_snapshot
+from core.models import TermSet
+
+logger = logging.getLogger('dict_config_logger')
+
+VALIDATOR_TIMEOUT = 60 * 60
+
+# python types accepted for each data_type found in uploaded schemas
+DATA_TYPES = {
+    'str': (str,),
+    'string': (str,),
+    'char': (str,),
+    'int': (int,),
+    'integer': (int,),
+    'float': (int, float),
+    'decimal': (int, float),
+    'number': (int, float),
+    'bool': (bool,),
+    'boolean': (bool,),
+    'dict': (dict,),
+    'object': (dict,),
+    'list': (list,),
+    'array': (list,),
+}
+
+
+class RecordValidator:
+    """
+    Flat validator compiled from the export of a Term Set, holding the
+    required paths, type checks and allowed keys of the schema
+    """
+
+    def __init__(self, schema):
+        self.required = []
+        self.types = []
+        # paths of every Term Set, mapped to the keys allowed inside it
+        self.allowed = {(): set()}
+        self._compile(schema, ())
+
+    def _compile(self, schema, prefix):
+        for key, value in schema.items():
+            path = prefix + (key,)
+            self.allowed[prefix].add(key)
+
+            # Terms export their attributes, Term Sets their members
+            if any(not isinstance(attr, dict) for attr in value.values()):
+                if value.get('use') == 'Required':
+                    self.required.append(path)
+                data_type = str(value.get('data_type', '')).lower()
+                if data_type in DATA_TYPES:
+                    self.types.append((path, DATA_TYPES[data_type],
+                                       data_type))
+            else:
+                self.allowed[path] = set()
+                self._compile(value, path)
+
+    def validate(self, record):
+        """Return the list of errors found in one record"""
+        errors = []
+
+        for path in self.required:
+            value = lookup(record, path)
+            if value is None or value == '':
+                errors.append(f"{'.'.join(path)}: required field is "
+                              f"missing")
+
+        for path, types, data_type in self.types:
+            value = lookup(record, path)
+            if value is None:
+                continue
+            # bool is a subclass of int but is not a valid int value
+            if not isinstance(value, types) or \
+                    (isinstance(value, bool) and bool not in types):
+                errors.append(f"{'.'.join(path)}: expected {data_type}")
+
+        self._check_keys(record, (), errors)
+        return errors
+
+    def _check_keys(self, record, prefix, errors):
+        for key, value in record.items():
+            path = prefix + (key,)
+            if key not in self.allowed[prefix]:
+                errors.append(f"{'.'.join(path)}: unexpected field")
+            elif path in self.allowed and isinstance(value, dict):
+                self._check_keys(value, path, errors)
+
+    def validate_all(self, records):
+        """Return the list of errors of every record in a batch"""
+        return [self.validate(record) for record in records]
+
+
+def lookup(record, path):
+    """Get the value at path in a nested record, or None"""
+    value = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def get_validator(term_set):
+    """function to fetch the compiled validator of a published Term Set"""
+    # the generation of the root changes whenever anything in its tree
+    # does, so the export is only read to compile a missing validator
+    root = term_set.root_term_set()
+    generation = term_set.generation if root == term_set.iri else \
+        TermSet.objects.filter(iri=root).values_list(
+            'generation', flat=True).first()
+    key = f'xss:validator:{term_set.iri}:{generation}'
+    validator = cache.get(key)
+
+    if validator is None:
+        snapshot = get_snapshot(term_set)
+        validator = RecordValidator(json.loads(bytes(snapshot.content)))
+        cache.set(key, validator, VALIDATOR_TIMEOUT)
+        logger.info(f"Compiled validator for {term_set.iri}")
+
+    return validator
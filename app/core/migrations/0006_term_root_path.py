@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def backfill_root_path(apps, schema_editor):
+    """Fill in the root and dotted path of existing rows from their iri"""
+    for model_name in ('ChildTermSet', 'Term'):
+        model = apps.get_model('core', model_name)
+        batch = []
+        for obj in model.objects.only('iri').iterator():
+            obj.root_id = obj.iri.split('?')[0].split('/')[0]
+            obj.path = re.sub('[/?]', '.', obj.iri[len(obj.root_id) + 1:])
+            batch.append(obj)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['root', 'path'])
+                batch = []
+        model.objects.bulk_update(batch, ['root', 'path'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_termsetsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='childtermset',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='childtermset',
+            name='root',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='descendant_term_sets', to='core.termset'),
+        ),
+        migrations.AddField(
+            model_name='term',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='term',
+            name='root',
+            field=models.ForeignKey(editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='descendant_terms', to='core.termset'),
+        ),
+        migrations.RunPython(backfill_root_path, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+def backfill_version_parts(apps, schema_editor):
+    """Fill in the integer version columns from the version string"""
+    TermSet = apps.get_model('core', 'TermSet')
+    batch = []
+    for term_set in TermSet.objects.only('version').iterator():
+        term_set.major_version, term_set.minor_version, \
+            term_set.patch_version = [int(part or 0) for part in
+                                      term_set.version.split('.')]
+        batch.append(term_set)
+        if len(batch) >= 1000:
+            TermSet.objects.bulk_update(
+                batch, ['major_version', 'minor_version', 'patch_version'])
+            batch = []
+    TermSet.objects.bulk_update(
+        batch, ['major_version', 'minor_version', 'patch_version'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_term_root_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termset',
+            name='major_version',
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='termset',
+            name='minor_version',
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='termset',
+            name='patch_version',
+            field=models.SmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='termset',
+            index=models.Index(fields=['name', 'major_version', 'minor_version', 'patch_version'], name='core_termse_name_9a74ed_idx'),
+        ),
+        migrations.RunPython(backfill_version_parts,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termset',
+            name='generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_termset_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemaledger',
+            name='reuse_previous_version',
+            field=models.BooleanField(default=False, help_text='copy unchanged Term Sets and Terms, and the mappings of carried over Terms, from the previous version'),
+        ),
+    ]
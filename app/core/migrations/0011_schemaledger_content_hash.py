@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:07
+
+import hashlib
+import json
+
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    """Hash the canonical JSON of the metadata of existing ledgers"""
+    SchemaLedger = apps.get_model('core', 'SchemaLedger')
+    for ledger in SchemaLedger.objects.exclude(metadata={}).only(
+            'metadata').iterator():
+        canonical = json.dumps(ledger.metadata, sort_keys=True,
+                               separators=(',', ':'), ensure_ascii=False)
+        SchemaLedger.objects.filter(pk=ledger.pk).update(
+            content_hash=hashlib.sha256(
+                canonical.encode('utf-8')).hexdigest())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_schemaledger_reuse_previous_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schemaledger',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_content_hash,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def tokenize(text):
+    """Split text into lower case tokens, adding the parts of camel case
+    words, as search_utils does when this migration was written"""
+    tokens = []
+    for word in re.findall(r'[^\W_]+', text or ''):
+        tokens.append(word.lower()[:64])
+        parts = re.findall('[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+', word)
+        if len(parts) > 1:
+            tokens.extend(part.lower()[:64] for part in parts)
+    return tokens
+
+
+def backfill_tokens(apps, schema_editor):
+    """Index the name, path and description of existing Terms"""
+    Term = apps.get_model('core', 'Term')
+    TermSearchToken = apps.get_model('core', 'TermSearchToken')
+    batch = []
+    for term in Term.objects.only('iri', 'name', 'path',
+                                  'description').iterator():
+        weights = {}
+        for text, weight in ((term.description, 1), (term.path, 2),
+                             (term.name, 3)):
+            for token in tokenize(text):
+                weights[token] = max(weight, weights.get(token, 0))
+        batch.extend(TermSearchToken(token=token, term_id=term.iri,
+                                     weight=weight)
+                     for token, weight in weights.items())
+        if len(batch) >= 1000:
+            TermSearchToken.objects.bulk_create(batch)
+            batch = []
+    TermSearchToken.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_schemaledger_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('weight', models.SmallIntegerField(default=1)),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='core.term')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='termsearchtoken',
+            index=models.Index(fields=['token', 'term'], name='core_termse_token_9d07c2_idx'),
+        ),
+        migrations.RunPython(backfill_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_termsearchtoken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='term',
+            index=models.Index(fields=['root', 'path'], name='core_term_root_id_3b9c11_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:13
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_term_root_path_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('kind', models.CharField(choices=[('term_set', 'term_set'), ('term', 'term'), ('tree', 'tree'), ('mapping', 'mapping'), ('schema_ledger', 'schema_ledger'), ('transformation_ledger', 'transformation_ledger')], max_length=255)),
+                ('action', models.CharField(choices=[('created', 'created'), ('updated', 'updated'), ('deleted', 'deleted')], max_length=255)),
+                ('iri', models.CharField(max_length=255)),
+                ('root', models.CharField(blank=True, max_length=255)),
+                ('related', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(fields=['modified', 'id'], name='core_change_modifie_5c6b74_idx'),
+        ),
+    ]
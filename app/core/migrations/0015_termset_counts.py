@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:15
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counts(apps, schema_editor):
+    """Count the Term Sets and Terms below existing roots"""
+    TermSet = apps.get_model('core', 'TermSet')
+    ChildTermSet = apps.get_model('core', 'ChildTermSet')
+    Term = apps.get_model('core', 'Term')
+    for root, count in ChildTermSet.objects.values_list('root').annotate(
+            count=Count('pk')).order_by():
+        TermSet.objects.filter(pk=root).update(term_set_count=count)
+    for root, count in Term.objects.values_list('root').annotate(
+            count=Count('pk')).order_by():
+        TermSet.objects.filter(pk=root).update(term_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_changeevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termset',
+            name='term_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='termset',
+            name='term_set_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
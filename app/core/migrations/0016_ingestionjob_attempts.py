@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_termset_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
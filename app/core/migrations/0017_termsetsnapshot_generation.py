@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_ingestionjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='termsetsnapshot',
+            name='generation',
+            field=models.PositiveIntegerField(default=0, help_text='generation of the Term Set the export was read at'),
+        ),
+    ]
@@ -1,16 +1,28 @@
+import gzip
+import hashlib
 import json
 import logging
 import os
 import re
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
 from uuid import uuid4
 
+import zstandard
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files import File
 from django.db import models
 from model_utils.models import TimeStampedModel
 
 logger = logging.getLogger('dict_config_logger')
 
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+DECOMPRESS_CHUNK_SIZE = 1024 * 1024
+
 
 def validate_version(value):
     check = re.fullmatch('[0-9]*[.][0-9]*[.][0-9]*', value)
@@ -21,29 +33,171 @@ def validate_version(value):
         )
 
 
+def split_version(value):
+    """Split a 0.0.0 version string into its integer parts"""
+    return [int(part or 0) for part in value.split('.')]
+
+
+def content_hash(metadata):
+    """Hash the canonical JSON of schema metadata, so that uploads which
+    only differ in key order or whitespace match"""
+    canonical = json.dumps(metadata, sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def file_hash(upload):
+    """Hash the bytes of an upload too large to load, so that the same
+    file uploaded again matches"""
+    digest = hashlib.sha256()
+    upload.seek(0)
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def decompress_upload(upload):
+    """Return the uploaded file, decompressed into a temporary file when it
+    holds gzip or zstd compressed JSON"""
+    upload.seek(0)
+    magic = upload.read(len(ZSTD_MAGIC))
+    upload.seek(0)
+
+    if magic.startswith(GZIP_MAGIC):
+        stream = gzip.GzipFile(fileobj=upload)
+    elif magic == ZSTD_MAGIC:
+        stream = zstandard.ZstdDecompressor().stream_reader(upload)
+    else:
+        return upload
+
+    output = tempfile.TemporaryFile()
+    size = 0
+    try:
+        chunk = stream.read(DECOMPRESS_CHUNK_SIZE)
+        while chunk:
+            size += len(chunk)
+            if size > settings.MAX_DECOMPRESSED_UPLOAD_SIZE:
+                raise ValidationError(
+                    '%(name)s is larger than %(limit)s bytes uncompressed',
+                    params={'name': upload.name,
+                            'limit': settings.MAX_DECOMPRESSED_UPLOAD_SIZE},
+                )
+            output.write(chunk)
+            chunk = stream.read(DECOMPRESS_CHUNK_SIZE)
+    except (OSError, EOFError, zlib.error, zstandard.ZstdError) as err:
+        output.close()
+        raise ValidationError(
+            '%(name)s could not be decompressed: %(error)s',
+            params={'name': upload.name, 'error': err},
+        )
+    except ValidationError:
+        output.close()
+        raise
+
+    output.seek(0)
+    name = re.sub(r'\.(gz|gzip|zst|zstd)$', '',
+                  os.path.basename(upload.name))
+    return File(output, name=name)
+
+
+# Term Sets removed by the delete in progress in each thread, mapped by iri
+# to whether the rest of their tree stays, shared by the delete signals
+deletes = threading.local()
+
+
+def iri_path(iri, root_iri):
+    """Get the dotted path of an iri below its root Term Set"""
+    return re.sub('[/?]', '.', iri[len(root_iri) + 1:])
+
+
+@contextmanager
+def tracked_delete():
+    """Scope the Term Sets the delete signals track to one delete, so that
+    a delete failing half way leaves nothing behind"""
+    if getattr(deletes, 'term_sets', None) is not None:
+        yield
+        return
+    deletes.term_sets = {}
+    try:
+        yield
+    finally:
+        deletes.term_sets = None
+
+
+def deleting_term_sets():
+    """Return the Term Sets tracked by the delete in progress in this
+    thread, or None outside of one"""
+    return getattr(deletes, 'term_sets', None)
+
+
+class TermSetQuerySet(models.QuerySet):
+    """QuerySet of Term Sets tracking the trees it deletes"""
+
+    def delete(self):
+        with tracked_delete():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class TermSet(TimeStampedModel):
     """Model for Termsets"""
     STATUS_CHOICES = [('published', 'published'),
                       ('retired', 'retired')]
+    # newest version first, backed by the name/version index
+    LATEST_VERSION = ('-major_version', '-minor_version', '-patch_version')
     iri = models.SlugField(max_length=255, unique=True,
                            allow_unicode=True, primary_key=True)
     uuid = models.UUIDField(default=uuid4, editable=False, unique=True)
     name = models.SlugField(max_length=255, allow_unicode=True)
     version = models.CharField(max_length=255, validators=[validate_version])
+    major_version = models.SmallIntegerField(default=0, editable=False)
+    minor_version = models.SmallIntegerField(default=0, editable=False)
+    patch_version = models.SmallIntegerField(default=0, editable=False)
+    # bumped on the root whenever anything in its tree changes
+    generation = models.PositiveIntegerField(default=0, editable=False)
+    # sizes of the tree below a root, kept up to date for the catalog
+    term_set_count = models.PositiveIntegerField(default=0, editable=False)
+    term_count = models.PositiveIntegerField(default=0, editable=False)
     status = models.CharField(max_length=255, choices=STATUS_CHOICES)
     updated_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
 
-    def save(self, *args, **kwargs):
-        """Generate iri for item"""
+    objects = TermSetQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'major_version', 'minor_version',
+                                 'patch_version']),
+        ]
+
+    def generate_iri(self):
+        """Generate iri and derived fields for item"""
         self.name = self.name.replace(' ', '_')
         self.iri = 'xss:' + self.version + '@' + self.name
+        self.major_version, self.minor_version, self.patch_version = \
+            split_version(self.version)
+
+    def save(self, *args, **kwargs):
+        """Generate iri for item"""
+        self.generate_iri()
         update_fields = kwargs.get('update_fields', None)
         if update_fields:
-            kwargs['update_fields'] = set(update_fields).union({'iri'})
+            kwargs['update_fields'] = set(update_fields).union(
+                {'iri', 'major_version', 'minor_version', 'patch_version'})
 
         super().save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        with tracked_delete():
+            return super().delete(*args, **kwargs)
+
+    def root_term_set(self):
+        """Get iri of the root Term Set for the current Term Set"""
+        return self.iri.split('/')[0]
+
     def export(self):
         children = {kid.name: kid.export()
                     for kid in self.children.filter(status='published')}
@@ -51,37 +205,35 @@ class TermSet(TimeStampedModel):
                  for term in self.terms.filter(status='published')}
         return {**children, **terms}
 
-    def mapped_to(self, target_root):
-        """Return dict of Terms mapped to anything in target_root string"""
-
-        # filter out children with no mapped terms
-        children = {kid.name: kid.mapped_to(target_root)
-                    for kid in self.children.filter(status='published')}
-        filtered_children = dict(
-            filter(lambda kid: len(kid[1]) != 0, children.items()))
-
-        # filter out terms that do not have a mapping
-        terms = {term.name: term.mapped_to(target_root)
-                 for term in self.terms.filter(status='published')}
-        filtered_terms = dict(
-            filter(lambda term: term[1] is not None, terms.items()))
-        return {**filtered_children, **filtered_terms}
-
 
 class ChildTermSet(TermSet):
     """Model for Child Termsets"""
     parent_term_set = models.ForeignKey(
         TermSet, on_delete=models.CASCADE, related_name='children')
-
-    def save(self, *args, **kwargs):
-        """Generate iri for item"""
+    root = models.ForeignKey(
+        TermSet, on_delete=models.CASCADE, null=True, editable=False,
+        related_name='descendant_term_sets')
+    path = models.CharField(max_length=255, blank=True, editable=False,
+                            db_index=True)
+
+    def generate_iri(self):
+        """Generate iri and derived fields for item"""
         self.name = self.name.replace(' ', '_')
         self.iri = self.parent_term_set.iri + '/' + self.name
         self.version = self.parent_term_set.version
+        self.major_version, self.minor_version, self.patch_version = \
+            split_version(self.version)
+        self.root_id = self.parent_term_set.root_term_set()
+        self.path = iri_path(self.iri, self.root_id)
+
+    def save(self, *args, **kwargs):
+        """Generate iri for item"""
+        self.generate_iri()
         update_fields = kwargs.get('update_fields', None)
         if update_fields:
-            kwargs['update_fields'] = set(
-                update_fields).union({'iri', 'version'})
+            kwargs['update_fields'] = set(update_fields).union(
+                {'iri', 'version', 'major_version', 'minor_version',
+                 'patch_version', 'root', 'path'})
 
         super(TermSet, self).save(*args, **kwargs)
 
@@ -104,25 +256,39 @@ class Term(TimeStampedModel):
     source = models.CharField(max_length=255, null=True, blank=True)
     term_set = models.ForeignKey(
         TermSet, on_delete=models.CASCADE, related_name='terms')
+    root = models.ForeignKey(
+        TermSet, on_delete=models.CASCADE, null=True, editable=False,
+        related_name='descendant_terms')
+    path = models.CharField(max_length=255, blank=True, editable=False,
+                            db_index=True)
     mapping = models.ManyToManyField('self', blank=True)
     updated_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     status = models.CharField(max_length=255, choices=STATUS_CHOICES)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['root', 'path']),
+        ]
+
     def root_term_set(self):
         """Get iri of the root Term Set for the current Term"""
-        if "/" in self.iri:
-            return self.iri[:self.iri.index('/')]
-        else:
-            return self.iri[:self.iri.index('?')]
+        return self.root_id
 
-    def save(self, *args, **kwargs):
-        """Generate iri for item"""
+    def generate_iri(self):
+        """Generate iri and derived fields for item"""
         self.name = self.name.replace(' ', '_')
         self.iri = self.term_set.iri + '?' + self.name
+        self.root_id = self.term_set.root_term_set()
+        self.path = iri_path(self.iri, self.root_id)
+
+    def save(self, *args, **kwargs):
+        """Generate iri for item"""
+        self.generate_iri()
         update_fields = kwargs.get('update_fields', None)
         if update_fields:
-            kwargs['update_fields'] = set(update_fields).union({'iri'})
+            kwargs['update_fields'] = set(
+                update_fields).union({'iri', 'root', 'path'})
 
         super().save(*args, **kwargs)
 
@@ -138,25 +304,38 @@ class Term(TimeStampedModel):
             attrs['description'] = self.description
         return {**attrs}
 
-    def path(self):
-        """Get the path of the Term"""
-        path = self.name
-        ts = self.term_set
 
-        # traverse the Term Sets to the root
-        try:
-            while ts.childtermset:
-                path = ts.name + '.' + path
-                ts = ts.childtermset.parent_term_set
-        except ChildTermSet.DoesNotExist:
-            return path
+class TermSetSnapshot(TimeStampedModel):
+    """Model for stored exports of published Term Sets"""
+    term_set = models.OneToOneField(
+        TermSet, on_delete=models.CASCADE, related_name='snapshot',
+        primary_key=True)
+    content = models.BinaryField(help_text="serialized export of the "
+                                           "Term Set")
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    generation = models.PositiveIntegerField(
+        default=0, help_text="generation of the Term Set the export was "
+                             "read at")
+
+    def __str__(self):
+        return str(self.term_set_id)
 
-    def mapped_to(self, target_root):
-        """Return path if Term is mapped to anything in target_root string"""
-        target_map = self.mapping.filter(iri__startswith=target_root)
-        if target_map.exists():
-            return target_map.first().path()
-        return None
+
+class TermSearchToken(models.Model):
+    """Model for the inverted index of Term names, paths and descriptions"""
+    token = models.CharField(max_length=64)
+    term = models.ForeignKey(Term, on_delete=models.CASCADE,
+                             related_name='search_tokens')
+    weight = models.SmallIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'term']),
+        ]
+
+    def __str__(self):
+        return f'{self.token} {self.term_id}'
 
 
 class SchemaLedger(TimeStampedModel):
@@ -184,6 +363,12 @@ class SchemaLedger(TimeStampedModel):
     major_version = models.SmallIntegerField(default=0)
     minor_version = models.SmallIntegerField(default=0)
     patch_version = models.SmallIntegerField(default=0)
+    reuse_previous_version = models.BooleanField(
+        default=False,
+        help_text="copy unchanged Term Sets and Terms, and the mappings of "
+                  "carried over Terms, from the previous version")
+    content_hash = models.CharField(max_length=64, blank=True,
+                                    editable=False, db_index=True)
     updated_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
 
@@ -200,12 +385,20 @@ class SchemaLedger(TimeStampedModel):
     def clean(self):
         # store the contents of the file in the metadata field
         if self.schema_file:
+            self.schema_file = decompress_upload(self.schema_file)
+
+        # large files are kept and parsed while ingesting instead
+        if self.schema_file and \
+                self.schema_file.size <= settings.STREAMING_UPLOAD_THRESHOLD:
             json_file = self.schema_file
             json_obj = json.load(json_file)  # deserializes it
 
             self.metadata = json_obj
             json_file.close()
             self.schema_file = None
+        elif self.schema_file:
+            self.metadata = {}
+            self.content_hash = file_hash(self.schema_file)
 
         # combine the versions
         version = \
@@ -219,6 +412,9 @@ class SchemaLedger(TimeStampedModel):
     def save(self, *args, **kwargs):
         """Generate iri for item"""
         self.schema_iri = 'xss:' + self.version + '@' + self.schema_name
+        # schemas uploaded as large files are hashed from the file in clean
+        if self.metadata:
+            self.content_hash = content_hash(self.metadata)
         update_fields = kwargs.get('update_fields', None)
         if update_fields:
             kwargs['update_fields'] = set(update_fields).union({'iri'})
@@ -258,9 +454,80 @@ class TransformationLedger(TimeStampedModel):
     def clean(self):
         # store the contents of the file in the schema_mapping field
         if self.schema_mapping_file:
+            self.schema_mapping_file = decompress_upload(
+                self.schema_mapping_file)
+
+        # large files are kept and parsed while mapping instead
+        if self.schema_mapping_file and self.schema_mapping_file.size <= \
+                settings.STREAMING_UPLOAD_THRESHOLD:
             json_file = self.schema_mapping_file
             json_obj = json.load(json_file)  # deserializes it
 
             self.schema_mapping = json_obj
             json_file.close()
             self.schema_mapping_file = None
+        elif self.schema_mapping_file:
+            self.schema_mapping = {}
+
+
+class IngestionJob(TimeStampedModel):
+    """Model for queued schema ingestion and mapping jobs"""
+    KIND_CHOICES = [('schema', 'schema'),
+                    ('mapping', 'mapping')]
+    STATE_CHOICES = [('pending', 'pending'),
+                     ('running', 'running'),
+                     ('succeeded', 'succeeded'),
+                     ('failed', 'failed')]
+
+    kind = models.CharField(max_length=255, choices=KIND_CHOICES)
+    state = models.CharField(max_length=255, choices=STATE_CHOICES,
+                             default='pending')
+    schema_ledger = models.ForeignKey(
+        SchemaLedger, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='jobs')
+    transformation_ledger = models.ForeignKey(
+        TransformationLedger, on_delete=models.CASCADE, null=True,
+        blank=True, related_name='jobs')
+    term_sets_processed = models.PositiveIntegerField(default=0)
+    terms_processed = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    duration = models.DurationField(null=True, blank=True)
+    message = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['state', 'created']),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} job {self.pk} ({self.state})'
+
+
+class ChangeEvent(TimeStampedModel):
+    """Model for the feed of changes to schemas, mappings and ledgers"""
+    KIND_CHOICES = [('term_set', 'term_set'),
+                    ('term', 'term'),
+                    ('tree', 'tree'),
+                    ('mapping', 'mapping'),
+                    ('schema_ledger', 'schema_ledger'),
+                    ('transformation_ledger', 'transformation_ledger')]
+    ACTION_CHOICES = [('created', 'created'),
+                      ('updated', 'updated'),
+                      ('deleted', 'deleted')]
+
+    kind = models.CharField(max_length=255, choices=KIND_CHOICES)
+    action = models.CharField(max_length=255, choices=ACTION_CHOICES)
+    iri = models.CharField(max_length=255)
+    root = models.CharField(max_length=255, blank=True)
+    related = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['modified', 'id']),
+        ]
+
+    def __str__(self):
+        return f'{self.action} {self.kind} {self.iri}'
@@ -1,51 +1,60 @@
 import logging
 
-from django.db.models.signals import post_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 
-from core.management.utils.signals_utils import (termset_map, termset_object,
-                                                 update_status)
-from core.models import SchemaLedger, TermSet, TransformationLedger
+from core.management.utils.catalog_utils import count_change, refresh_counts
+from core.management.utils.change_utils import (record_change,
+                                                record_instance_change)
+from core.management.utils.job_utils import enqueue_job
+from core.management.utils.search_utils import index_term
+from core.management.utils.signals_utils import update_status
+from core.management.utils.snapshot_utils import (invalidate_snapshot,
+                                                  refresh_snapshot)
+from core.models import (ChildTermSet, SchemaLedger, Term, TermSet,
+                         TransformationLedger, deleting_term_sets)
 
 logger = logging.getLogger('dict_config_logger')
 
 
+def in_deleted_subtree(instance):
+    """Return whether a row is deleted along with a Term Set above it"""
+    deleting = deleting_term_sets() or {}
+    if isinstance(instance, Term):
+        return instance.term_set_id in deleting
+    return instance.parent_term_set_id in deleting
+
+
 @receiver(post_save, sender=SchemaLedger)
 def create_term_set(sender, instance, created, **kwargs):
     if created:
-        termset = TermSet.objects.create(name=instance.schema_name,
-                                         version=instance.version,
-                                         status=instance.status,
-                                         updated_by=instance.updated_by)
-        termset.save()
-
-        termset_object(instance.metadata, termset, instance.status,
-                       instance.updated_by)
-
-        logger.info("TermSet created")
+        job = enqueue_job('schema', schema_ledger=instance)
+        logger.info(f"Schema ingestion job {job.pk} {job.state}")
 
 
 @receiver(post_save, sender=SchemaLedger)
 def update_term_set(sender, instance, created, **kwargs):
     if not created:
-        termset = TermSet.objects.get(iri=instance)
+        termset = TermSet.objects.filter(iri=instance.schema_iri).first()
+        # a queued or failed ingestion creates the Term Set later, with
+        # the status the ledger has then
+        if termset is None:
+            logger.info("TermSet not ingested yet")
+            return
         termset.status = instance.status
         termset.updated_by = instance.updated_by
+        # saving the root cascades the status through update_schema_ledger
         termset.save()
 
-        update_status(termset, termset.status, termset.updated_by)
         logger.info("TermSet updated")
 
 
 @receiver(post_save, sender=TransformationLedger)
 def map_term_sets(sender, instance, created, **kwargs):
     if created:
-        target = instance.target_schema
-        source = instance.source_schema
-
-        termset_map(target, source, instance.schema_mapping)
-
-        logger.info("Term Sets mapped")
+        job = enqueue_job('mapping', transformation_ledger=instance)
+        logger.info(f"Mapping job {job.pk} {job.state}")
 
 
 @receiver(post_save, sender=TermSet)
@@ -56,4 +65,93 @@ def update_schema_ledger(sender, instance, created, **kwargs):
                    updated_by=instance.updated_by)
 
         update_status(instance, instance.status, instance.updated_by)
+        record_change('tree', 'updated', instance.iri, root=instance.iri,
+                      status=instance.status)
+        refresh_snapshot(instance)
         logger.info("SchemaLedger updated")
+
+
+@receiver(post_save, sender=ChildTermSet)
+@receiver(post_save, sender=Term)
+def invalidate_term_set_snapshot(sender, instance, created, **kwargs):
+    counts = count_change(sender, 1) if created else {}
+    invalidate_snapshot(instance.root_term_set(), **counts)
+
+
+@receiver(pre_delete, sender=TermSet)
+@receiver(pre_delete, sender=ChildTermSet)
+def mark_deleted_term_set(sender, instance, **kwargs):
+    deleting = deleting_term_sets()
+    if deleting is not None:
+        deleting.setdefault(instance.iri, False)
+
+
+@receiver(post_delete, sender=Term)
+def invalidate_deleted_term(sender, instance, **kwargs):
+    if not in_deleted_subtree(instance):
+        invalidate_snapshot(instance.root_term_set(),
+                            **count_change(Term, -1))
+
+
+@receiver(post_delete, sender=ChildTermSet)
+def mark_deleted_subtree(sender, instance, **kwargs):
+    if in_deleted_subtree(instance):
+        return
+    deleting = deleting_term_sets()
+    if deleting is not None:
+        deleting[instance.iri] = True
+    else:
+        # the rows below were counted one by one
+        invalidate_snapshot(instance.root_term_set(),
+                            **count_change(ChildTermSet, -1))
+
+
+@receiver(post_delete, sender=TermSet)
+def invalidate_deleted_subtree(sender, instance, **kwargs):
+    # TermSet rows are deleted after every row below them, so the counts of
+    # a tree losing a subtree are taken once it is gone
+    if (deleting_term_sets() or {}).pop(instance.iri, False):
+        root_iri = instance.root_term_set()
+        refresh_counts(root_iri)
+        invalidate_snapshot(root_iri)
+
+
+@receiver(post_save, sender=Term)
+def index_term_search_tokens(sender, instance, **kwargs):
+    index_term(instance)
+
+
+@receiver(post_save, sender=TermSet)
+@receiver(post_save, sender=ChildTermSet)
+@receiver(post_save, sender=Term)
+@receiver(post_save, sender=SchemaLedger)
+@receiver(post_save, sender=TransformationLedger)
+def record_saved_change(sender, instance, created, **kwargs):
+    record_instance_change(instance, 'created' if created else 'updated')
+
+
+@receiver(post_delete, sender=ChildTermSet)
+@receiver(post_delete, sender=Term)
+@receiver(post_delete, sender=SchemaLedger)
+@receiver(post_delete, sender=TransformationLedger)
+def record_deleted_change(sender, instance, **kwargs):
+    # a deleted subtree is one change, recorded for the Term Set on top
+    if sender in (ChildTermSet, Term) and in_deleted_subtree(instance):
+        return
+    record_instance_change(instance, 'deleted')
+
+
+@receiver(post_delete, sender=TermSet)
+def record_deleted_tree(sender, instance, **kwargs):
+    # Child Term Sets also delete a TermSet row, recorded above
+    if instance.iri == instance.root_term_set():
+        record_change('tree', 'deleted', instance.iri, root=instance.iri,
+                      status=instance.status)
+
+
+@receiver(m2m_changed, sender=Term.mapping.through)
+def record_mapping_change(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and \
+            isinstance(instance, Term):
+        record_change('mapping', 'updated', instance.iri,
+                      root=instance.root_id, status=instance.status)
@@ -1,9 +1,22 @@
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from ddt import ddt
 from django.core.management import call_command
+from django.db import connection
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase, tag
+from django.test import SimpleTestCase, override_settings, tag
+from django.utils import timezone
+
+from core.management.utils.ingest_utils import ingest_metadata
+from core.management.utils.job_utils import (MAX_JOB_ATTEMPTS, JobProgress,
+                                             claim_job, retry_job)
+
+from core.models import (IngestionJob, SchemaLedger, TermSearchToken,
+                         TermSet)
+
+from .test_setup import TestSetUp
 
 
 @tag('unit')
@@ -27,3 +40,146 @@ class CommandTests(SimpleTestCase):
             gi.ensure_connection.side_effect = [OperationalError] * 5 + [True]
             call_command('waitdb')
             self.assertEqual(gi.ensure_connection.call_count, 6)
+
+
+@tag('unit')
+class IngestWorkerTests(TestSetUp):
+    """Test cases for ingestworker """
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_ingest_worker(self):
+        """Test that queued schema uploads are ingested by the worker"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        job = IngestionJob.objects.get(schema_ledger__schema_name='queued')
+
+        self.assertEqual(job.state, 'pending')
+        self.assertFalse(TermSet.objects.filter(name='queued').exists())
+
+        call_command('ingestworker', '--once', stdout=StringIO())
+        job.refresh_from_db()
+
+        self.assertEqual(job.state, 'succeeded')
+        self.assertEqual(job.terms_processed, 2)
+        self.assertTrue(TermSet.objects.filter(name='queued').exists())
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_status_change_before_ingestion(self):
+        """Test that a status change made while the job is queued is
+        applied when the worker ingests the schema"""
+        ledger = SchemaLedger(schema_name='queued', metadata=self.metadata,
+                              status=self.status, version=self.version)
+        ledger.save()
+        ledger.status = 'retired'
+        ledger.save()
+
+        call_command('ingestworker', '--once', stdout=StringIO())
+
+        self.assertEqual(TermSet.objects.get(name='queued').status,
+                         'retired')
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_reclaim_abandoned_job(self):
+        """Test that running jobs without progress are queued again until
+        they run out of attempts"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        SchemaLedger(schema_name='lost', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        stale = timezone.now() - timedelta(hours=1)
+        IngestionJob.objects.filter(
+            schema_ledger__schema_name='queued').update(
+            state='running', attempts=1, modified=stale)
+        IngestionJob.objects.filter(
+            schema_ledger__schema_name='lost').update(
+            state='running', attempts=MAX_JOB_ATTEMPTS, modified=stale)
+
+        call_command('ingestworker', '--once', stdout=StringIO())
+        queued = IngestionJob.objects.get(
+            schema_ledger__schema_name='queued')
+        lost = IngestionJob.objects.get(schema_ledger__schema_name='lost')
+
+        self.assertEqual((queued.state, queued.attempts), ('succeeded', 2))
+        self.assertEqual(lost.state, 'failed')
+        self.assertFalse(TermSet.objects.filter(name='lost').exists())
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_job_progress(self):
+        """Test that the counters of a running job are stored after every
+        written batch"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        job = IngestionJob.objects.get(schema_ledger__schema_name='queued')
+        termset = TermSet.objects.create(name='queued', version=self.version,
+                                         status=self.status)
+
+        ingest_metadata(self.metadata, termset, self.status, None,
+                        JobProgress(job))
+        job.refresh_from_db()
+
+        self.assertEqual((job.term_sets_processed, job.terms_processed),
+                         (1, 2))
+
+    def test_job_progress_in_transaction(self):
+        """Test that a job run inside a transaction stores its counters
+        through the connection holding its uncommitted row"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        job = IngestionJob.objects.get(schema_ledger__schema_name='queued')
+
+        with patch.object(connection, 'vendor', 'mysql'), \
+                patch('core.management.utils.job_utils.connections') as \
+                connections:
+            progress = JobProgress(job)
+
+        self.assertIsNone(progress.connection)
+        connections.create_connection.assert_not_called()
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_worker_survives_lost_connection(self):
+        """Test that the worker keeps claiming jobs after a database
+        error"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        job = claim_job()
+        claim = patch('core.management.commands.ingestworker.claim_job',
+                      side_effect=[OperationalError('gone away'), job, None])
+
+        with claim, patch('time.sleep'):
+            call_command('ingestworker', '--once', stdout=StringIO())
+
+        self.assertEqual(IngestionJob.objects.get(
+            schema_ledger__schema_name='queued').state, 'succeeded')
+
+    @override_settings(ASYNC_INGESTION=True)
+    def test_retry_job(self):
+        """Test that a failed job can be queued and run again"""
+        SchemaLedger(schema_name='queued', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        with patch('core.management.utils.job_utils.ingest_schema',
+                   side_effect=ValueError('broken')):
+            call_command('ingestworker', '--once', stdout=StringIO())
+        job = IngestionJob.objects.get(schema_ledger__schema_name='queued')
+
+        self.assertEqual((job.state, job.message), ('failed', 'broken'))
+
+        with override_settings(ASYNC_INGESTION=False):
+            retry_job(job)
+        job.refresh_from_db()
+
+        self.assertEqual((job.state, job.attempts), ('succeeded', 1))
+
+
+@tag('unit')
+class RebuildSearchIndexTests(TestSetUp):
+    """Test cases for rebuildsearchindex """
+
+    def test_rebuild_search_index(self):
+        """Test that the index is rebuilt for every schema"""
+        TermSearchToken.objects.all().delete()
+
+        call_command('rebuildsearchindex', stdout=StringIO())
+
+        self.assertEqual(set(TermSearchToken.objects.filter(
+            token='test1').values_list('term_id', flat=True)),
+            {'xss:1.0.0@test_name/test?test1'})
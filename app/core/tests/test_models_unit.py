@@ -1,6 +1,11 @@
+import gzip
+import hashlib
 from unittest.mock import patch
 
+import zstandard
+
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import tag
 
 from core.models import (ChildTermSet, SchemaLedger, Term, TermSet,
@@ -44,10 +49,70 @@ class ModelTests(TestSetUp):
         self.assertEqual(schema.minor_version, minor_version)
         self.assertEqual(schema.patch_version, patch_version)
 
+    def test_schema_ledger_clean_large_file(self):
+        """Test that uploads above the threshold are kept as files and only
+        smaller ones are loaded into metadata"""
+        content = b'{"test": {"test1": {"use": "Required"}}}'
+        schema = SchemaLedger(schema_name='test_name', status='published',
+                              schema_file=SimpleUploadedFile('s.json',
+                                                             content))
+
+        with self.settings(STREAMING_UPLOAD_THRESHOLD=len(content) - 1):
+            schema.clean()
+
+        self.assertTrue(schema.schema_file)
+        self.assertEqual(schema.metadata, {})
+        self.assertEqual(schema.content_hash,
+                         hashlib.sha256(content).hexdigest())
+
+        with self.settings(STREAMING_UPLOAD_THRESHOLD=len(content)):
+            schema.clean()
+
+        self.assertFalse(schema.schema_file)
+        self.assertEqual(schema.metadata,
+                         {"test": {"test1": {"use": "Required"}}})
+
+    def test_schema_ledger_clean_compressed_file(self):
+        """Test that gzip and zstd compressed uploads are decompressed"""
+        content = b'{"test": {"test1": {"use": "Required"}}}'
+
+        for compressed in (gzip.compress(content),
+                           zstandard.ZstdCompressor().compress(content)):
+            schema = SchemaLedger(schema_name='test_name',
+                                  status='published',
+                                  schema_file=SimpleUploadedFile(
+                                      's.json.gz', compressed))
+            schema.clean()
+
+            self.assertEqual(schema.metadata,
+                             {"test": {"test1": {"use": "Required"}}})
+
+    def test_schema_ledger_clean_compressed_file_too_large(self):
+        """Test that compressed uploads past the decompressed size limit or
+        corrupted ones are rejected"""
+        content = b'{"test": {"test1": {"use": "Required"}}}'
+        schema = SchemaLedger(schema_name='test_name', status='published',
+                              schema_file=SimpleUploadedFile(
+                                  's.json.gz', gzip.compress(content)))
+
+        with self.settings(MAX_DECOMPRESSED_UPLOAD_SIZE=len(content) - 1):
+            self.assertRaises(ValidationError, schema.clean)
+
+        schema.schema_file = SimpleUploadedFile(
+            's.json.gz', gzip.compress(content)[:-8])
+        self.assertRaises(ValidationError, schema.clean)
+
+        # flip the bits of the deflate payload between header and trailer
+        corrupt = bytearray(gzip.compress(content))
+        corrupt[10:-8] = bytes(byte ^ 0xff for byte in corrupt[10:-8])
+        schema.schema_file = SimpleUploadedFile('s.json.gz', bytes(corrupt))
+        self.assertRaises(ValidationError, schema.clean)
+
     def test_transformation_ledger(self):
         """Test that creating a transformationLedger is successful"""
 
-        with patch('core.signals.termset_map'):
+        with patch('core.management.utils.job_utils.termset_map',
+                   return_value=0):
             self.termset.save()
 
             source_schema_name = self.termset
@@ -86,6 +151,8 @@ class ModelTests(TestSetUp):
         self.assertEquals(ts.name, ts_name)
         self.assertEquals(ts.version, ts_version)
         self.assertEquals(ts.status, ts_status)
+        self.assertEquals((ts.major_version, ts.minor_version,
+                           ts.patch_version), (0, 0, 1))
 
     def test_child_term_set(self):
         """Test that creating a ChildTermSet is successful"""
@@ -1,8 +1,16 @@
 from unittest.mock import patch
 
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete
 from django.test import tag
+from django.test.utils import CaptureQueriesContext
 
-from ..models import SchemaLedger, TermSet, TransformationLedger
+from ..management.utils import snapshot_utils
+from ..management.utils.catalog_utils import refresh_counts
+from ..management.utils.snapshot_utils import get_snapshot
+from ..models import (ChangeEvent, SchemaLedger, Term, TermSet,
+                      TermSetSnapshot, TransformationLedger,
+                      deleting_term_sets)
 from .test_setup import TestSetUp
 
 
@@ -13,7 +21,7 @@ class SignalTests(TestSetUp):
         """Function to check create postsave of schema ledger
         in termsets and terms"""
 
-        with patch('core.signals.termset_object'):
+        with patch('core.management.utils.ingest_utils.ingest_metadata'):
             self.schema.save()
             termset = TermSet.objects.get(name=self.schema_name)
 
@@ -38,10 +46,21 @@ class SignalTests(TestSetUp):
             termset = TermSet.objects.get(name=self.schema_name)
             self.assertEqual(termset.status, 'retired')
 
+    def test_update_term_set_cascades_once(self):
+        """Test that one ledger status change runs a single cascade"""
+        with patch('core.signals.update_status') as cascade:
+            schemaledger = \
+                SchemaLedger.objects.get(schema_name=self.schema_name)
+            schemaledger.status = 'retired'
+            schemaledger.save()
+
+            cascade.assert_called_once()
+
     def test_map_term_sets(self):
         """Test to verify mappings are kicked off"""
 
-        with patch('core.signals.termset_map') as map,\
+        with patch('core.management.utils.job_utils.termset_map',
+                   return_value=0) as map,\
                 patch('core.signals.create_term_set'), \
                 patch('core.signals.update_term_set'):
             source = TermSet(name='source', version='1.0.0')
@@ -56,3 +75,111 @@ class SignalTests(TestSetUp):
             source.delete()
             target.delete()
             map.assert_called_once()
+
+    def test_snapshot_invalidated(self):
+        """Test that publishing stores a snapshot and editing a Term drops
+        it"""
+        termset = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        self.assertTrue(TermSetSnapshot.objects.filter(
+            term_set=termset).exists())
+
+        term = Term.objects.get(iri='xss:1.0.0@test_name/test?test1')
+        term.description = 'changed'
+        term.save()
+
+        self.assertFalse(TermSetSnapshot.objects.filter(
+            term_set=termset).exists())
+
+    def test_child_snapshot_not_stored(self):
+        """Test that the export of a Child Term Set is rendered fresh rather
+        than stored"""
+        child = TermSet.objects.get(iri='xss:1.0.0@test_name/test')
+
+        self.assertIn(b'"test1"', bytes(get_snapshot(child).content))
+        self.assertFalse(TermSetSnapshot.objects.filter(
+            term_set=child).exists())
+
+        term = Term.objects.get(iri='xss:1.0.0@test_name/test?test1')
+        term.description = 'changed'
+        term.save()
+
+        self.assertIn(b'"changed"', bytes(get_snapshot(child).content))
+
+    def test_snapshot_racing_change_not_served(self):
+        """Test that an export read while the tree changes is not served
+        after the change"""
+        termset = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        TermSetSnapshot.objects.filter(term_set=termset).delete()
+        term = Term.objects.get(iri='xss:1.0.0@test_name/test?test1')
+        render = snapshot_utils.render_snapshot
+
+        def render_then_change(term_set):
+            snapshot = render(term_set)
+            term.description = 'changed'
+            term.save()
+            return snapshot
+
+        with patch.object(snapshot_utils, 'render_snapshot',
+                          side_effect=render_then_change):
+            self.assertNotIn(b'"changed"',
+                             bytes(get_snapshot(termset).content))
+
+        self.assertIn(b'"changed"', bytes(get_snapshot(termset).content))
+
+    def test_cascade_delete_skips_rows(self):
+        """Test that rows deleted along with their root Term Set do not
+        update the root one by one"""
+        termset = TermSet.objects.get(iri='xss:1.0.0@test_name')
+
+        with patch('core.signals.invalidate_snapshot') as invalidate, \
+                patch('core.signals.refresh_counts') as refresh:
+            termset.delete()
+
+        invalidate.assert_not_called()
+        refresh.assert_not_called()
+        self.assertIsNone(deleting_term_sets())
+        self.assertFalse(Term.objects.filter(root=termset.iri).exists())
+
+    def test_failed_delete_not_tracked(self):
+        """Test that a delete failing between its signals leaves no Term
+        Set tracked for later deletes"""
+        child = TermSet.objects.get(iri='xss:1.0.0@test_name/test')
+
+        def fail(**kwargs):
+            raise DatabaseError('lost')
+
+        post_delete.connect(fail, sender=Term)
+        try:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                child.delete()
+        finally:
+            post_delete.disconnect(fail, sender=Term)
+
+        self.assertIsNone(deleting_term_sets())
+        refresh_counts('xss:1.0.0@test_name')
+        Term.objects.get(iri='xss:1.0.0@test_name/test?test1').delete()
+        self.assertEqual(TermSet.objects.get(
+            iri='xss:1.0.0@test_name').term_count, 1)
+
+    def test_cascade_delete_records_tree(self):
+        """Test that deleting a root Term Set records one event, with the
+        same number of queries whatever the size of its tree"""
+        small = {'test': {'test1': {'use': 'Required'}}}
+        large = {'test': {f'test{i}': {'use': 'Required'}
+                          for i in range(50)}}
+        queries = []
+        for name, metadata in (('small', small), ('large', large)):
+            SchemaLedger(schema_name=name, metadata=metadata,
+                         status=self.status, version=self.version).save()
+            iri = 'xss:1.0.0@' + name
+            termset = TermSet.objects.get(iri=iri)
+            latest = ChangeEvent.objects.latest('pk').pk
+
+            with CaptureQueriesContext(connection) as context:
+                termset.delete()
+            queries.append(len(context))
+
+            self.assertEqual(list(ChangeEvent.objects.filter(
+                pk__gt=latest).values_list('kind', 'action', 'iri')),
+                [('tree', 'deleted', iri)])
+        self.assertEqual(queries[0], queries[1])
@@ -1,13 +1,26 @@
+import json
 from unittest.mock import patch
 
 from ddt import data, ddt, unpack
+from django.core.files.base import ContentFile
 from django.test import tag
+from rest_framework.renderers import JSONRenderer
 
+from ..management.utils.ingest_utils import (ingest_metadata, ingest_upload,
+                                             stream_mapping)
+from ..management.utils.search_utils import search_terms, tokenize
 from ..management.utils.signals_utils import (create_child_termset,
-                                              create_terms, term_object,
-                                              termset_object, update_status)
-from ..management.utils.xss_helper import sort_version
-from ..models import ChildTermSet, TermSet
+                                              create_terms, flatten_mapping,
+                                              term_object,
+                                              termset_map, termset_object,
+                                              update_status)
+from ..management.utils.transform_utils import (compose_mapping,
+                                                find_mapping_path, get_plan)
+from ..management.utils.tree_utils import (TermSetTree, mapped_terms,
+                                           stream_export)
+from ..management.utils.validation_utils import RecordValidator
+from ..models import (ChildTermSet, SchemaLedger, Term, TermSet,
+                      TransformationLedger)
 from .test_setup import TestSetUp
 
 
@@ -70,20 +83,459 @@ class UtilsTests(TestSetUp):
         """Test function to update the status of children terms/termsets"""
         self.schema.save()
         termset = TermSet.objects.get(name='test_name')
-        update_status(termset, "Retired", self.user)
+        with self.assertNumQueries(2):
+            update_status(termset, "Retired", self.user)
         child_termset = ChildTermSet.objects.get(parent_term_set=termset)
 
         self.assertEqual(child_termset.status, "Retired")
+        self.assertFalse(child_termset.terms.exclude(
+            status="Retired").exists())
 
-    def test_sort_version(self):
-        """Test function to sort TermSets by version"""
-        one = TermSet(name="one", version="1.1.1")
-        two = TermSet(name="two", version="2.2.2")
-        three = TermSet(name="three", version="2.2.3")
-        ts_list = [one, three, two]
+    def test_term_set_tree_export(self):
+        """Test that the tree loader matches the recursive export"""
+        termset = TermSet.objects.get(iri='xss:1.0.0@test_name')
 
-        sort_version(ts_list, reverse_order=True)
-        self.assertEqual(ts_list, [three, two, one])
+        with self.assertNumQueries(2):
+            exported = TermSetTree(termset).export()
 
-        sort_version(ts_list)
-        self.assertEqual(ts_list, [one, two, three])
+        self.assertDictEqual(exported, termset.export())
+        self.assertEqual(exported['test']['test1'], {'use': 'Required'})
+
+    def test_term_set_tree_export_child(self):
+        """Test that a tree loaded from a Child Term Set exports its own
+        subtree"""
+        child = TermSet.objects.get(iri='xss:1.0.0@test_name/test')
+        ChildTermSet(parent_term_set=ChildTermSet.objects.get(pk=child.pk),
+                     name='nested', status=self.status).save()
+
+        exported = TermSetTree(child).export()
+
+        self.assertDictEqual(exported, child.export())
+        self.assertEqual(exported['test1'], {'use': 'Required'})
+        self.assertEqual(exported['nested'], {})
+
+    def test_mapped_terms(self):
+        """Test that the Terms mapped to a Term, Term Set or schema are
+        found in one query"""
+        source = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        SchemaLedger(schema_name='target', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        target = TermSet.objects.get(iri='xss:1.0.0@target')
+        termset_map(target, source, {'test': {'test1': 'test.test1',
+                                              'test2': 'test.test1'}})
+        expected = [{'iri': 'xss:1.0.0@target/test?test1',
+                     'schema': 'xss:1.0.0@target', 'path': 'test.test1'},
+                    {'iri': 'xss:1.0.0@target/test?test2',
+                     'schema': 'xss:1.0.0@target', 'path': 'test.test2'}]
+
+        for iri in ('xss:1.0.0@test_name', 'xss:1.0.0@test_name/test',
+                    'xss:1.0.0@test_name/test?test1'):
+            with self.assertNumQueries(1):
+                mapped = mapped_terms(iri)
+            self.assertEqual(mapped,
+                             {'xss:1.0.0@test_name/test?test1': expected})
+
+        self.assertEqual(mapped_terms('xss:1.0.0@test_name/test?test2'), {})
+
+    def test_compose_mapping(self):
+        """Test that mappings are composed through the shortest chain of
+        ledgers and used by transformation plans"""
+        roots = {'a': TermSet.objects.get(iri='xss:1.0.0@test_name')}
+        for name in ('b', 'c'):
+            SchemaLedger(schema_name=name, metadata=self.metadata,
+                         status=self.status, version=self.version).save()
+            roots[name] = TermSet.objects.get(iri='xss:1.0.0@' + name)
+        TransformationLedger(source_schema=roots['a'],
+                             target_schema=roots['b'],
+                             schema_mapping={'test': {
+                                 'test1': 'test.test2',
+                                 'test2': 'test.test1'}},
+                             status=self.status).save()
+        TransformationLedger(source_schema=roots['b'],
+                             target_schema=roots['c'],
+                             schema_mapping={'test': {
+                                 'test1': 'test.test1'}},
+                             status=self.status).save()
+
+        path, generations = find_mapping_path(roots['a'].iri,
+                                              roots['c'].iri)
+
+        self.assertEqual(path, [roots['a'].iri, roots['b'].iri,
+                                roots['c'].iri])
+        self.assertEqual(compose_mapping(path),
+                         {'test': {'test1': 'test.test2'}})
+        self.assertEqual(find_mapping_path(roots['c'].iri,
+                                           roots['a'].iri)[0], None)
+        self.assertEqual(
+            get_plan(roots['a'], roots['c']).transform(
+                {'test': {'test1': 1, 'test2': 2}}),
+            {'test': {'test1': 2}})
+        self.assertIsNone(get_plan(roots['c'], roots['a']))
+
+        # a cached plan is reused without walking the ledgers
+        with self.assertNumQueries(2):
+            get_plan(roots['a'], roots['c'])
+
+    def test_stream_export(self):
+        """Test that the streamed export matches the rendered export, also
+        when a Term shares the name of a Child Term Set"""
+        termset = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        child = ChildTermSet.objects.get(iri='xss:1.0.0@test_name/test')
+        Term(term_set=termset, name='test', use='Optional',
+             status=self.status).save()
+        ChildTermSet(parent_term_set=child, name='empty',
+                     status=self.status).save()
+
+        streamed = b''.join(stream_export(termset.iri))
+
+        self.assertEqual(streamed, JSONRenderer().render(
+            TermSetTree(termset).export()))
+        self.assertEqual(json.loads(streamed)['test'], {'use': 'Optional'})
+
+    def test_stream_export_depth_first(self):
+        """Test that the streamed export walks the tree from two queries,
+        keeping sibling order and leaving out retired Term Sets"""
+        metadata = {'a': {'x': {'t': {'use': 'Required'}},
+                          't': {'use': 'Optional'}},
+                    'a-b': {'t': {'use': 'Optional'}},
+                    'a0': {'t': {'use': 'Optional'}},
+                    'gone': {'kept': {'t': {'use': 'Optional'}}},
+                    't': {'use': 'Required', 'data_type': 'str'}}
+        SchemaLedger(schema_name='deep', metadata=metadata,
+                     status=self.status, version='1.0.0').save()
+        ChildTermSet.objects.filter(iri='xss:1.0.0@deep/gone').update(
+            status='retired')
+
+        for iri in ('xss:1.0.0@deep', 'xss:1.0.0@deep/a'):
+            termset = TermSet.objects.get(iri=iri)
+            with self.assertNumQueries(2):
+                streamed = b''.join(stream_export(iri))
+
+            self.assertEqual(streamed, JSONRenderer().render(
+                TermSetTree(termset).export()))
+        self.assertEqual(list(json.loads(b''.join(stream_export(
+            'xss:1.0.0@deep')))), ['a', 'a-b', 'a0', 't'])
+
+    def test_stream_export_retired_child(self):
+        """Test that the Terms of a retired Child Term Set are skipped
+        without emptying the Term Sets after it"""
+        metadata = {'a': {'x': {'use': 'Required'}},
+                    'c': {'z': {'use': 'Required'}},
+                    't': {'use': 'Optional'}}
+        SchemaLedger(schema_name='retired', metadata=metadata,
+                     status=self.status, version='1.0.0').save()
+        termset = TermSet.objects.get(iri='xss:1.0.0@retired')
+        ChildTermSet.objects.filter(iri='xss:1.0.0@retired/a').update(
+            status='retired')
+
+        self.assertEqual(b''.join(stream_export(termset.iri)),
+                         JSONRenderer().render(TermSetTree(termset).export()))
+        self.assertEqual(json.loads(b''.join(stream_export(termset.iri))),
+                         {'c': {'z': {'use': 'Required'}},
+                          't': {'use': 'Optional'}})
+
+    def test_stream_export_shadowed_child(self):
+        """Test that a Term replacing a Child Term Set of the same name is
+        exported in its place without emptying the Term Sets after it"""
+        metadata = {'a': {'x': {'use': 'Required'}},
+                    'c': {'z': {'use': 'Required'}},
+                    't': {'use': 'Optional'}}
+        SchemaLedger(schema_name='shadowed', metadata=metadata,
+                     status=self.status, version='1.0.0').save()
+        termset = TermSet.objects.get(iri='xss:1.0.0@shadowed')
+        Term(term_set=termset, name='a', use='Recommended',
+             status=self.status).save()
+
+        with self.assertNumQueries(3):
+            streamed = b''.join(stream_export(termset.iri))
+
+        self.assertEqual(streamed, JSONRenderer().render(
+            TermSetTree(termset).export()))
+        self.assertEqual(json.loads(streamed),
+                         {'a': {'use': 'Recommended'},
+                          'c': {'z': {'use': 'Required'}},
+                          't': {'use': 'Optional'}})
+
+    def test_term_set_tree_mapped_to(self):
+        """Test that mappings resolve from a single pass over the links"""
+        source = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        SchemaLedger(schema_name='target', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        target = TermSet.objects.get(iri='xss:1.0.0@target')
+        TransformationLedger(source_schema=source, target_schema=target,
+                             schema_mapping={'test': {'test1': 'test.test2'}},
+                             status=self.status).save()
+        tree = TermSetTree(target)
+
+        with self.assertNumQueries(1):
+            mapped = tree.mapped_to(source.iri)
+
+        self.assertDictEqual(mapped, {'test': {'test1': 'test.test2'}})
+
+    def test_ingest_metadata(self):
+        """Test that bulk ingestion creates the same rows as termset_object"""
+        metadata = {'a': {'b': {'t1': {'use': 'Required',
+                                       'data_type': 'str'}},
+                          't2': {'use': 'Optional'}},
+                    't3': {'use': 'Recommended', 'description': 'desc'},
+                    'skip': 'value'}
+        bulk = TermSet.objects.create(name='bulk', version='1.0.0',
+                                      status=self.status)
+        legacy = TermSet.objects.create(name='legacy', version='1.0.0',
+                                        status=self.status)
+
+        ingest_metadata(metadata, bulk, self.status, self.user)
+        termset_object(metadata, legacy, self.status, self.user)
+
+        def rows(root):
+            return (list(ChildTermSet.objects.filter(root=root).values_list(
+                        'path', 'version',
+                        'status', 'updated_by').order_by('path')),
+                    list(Term.objects.filter(root=root).values_list(
+                        'path', 'use', 'data_type',
+                        'description', 'status',
+                        'updated_by').order_by('path')))
+
+        self.assertEqual(rows(bulk), rows(legacy))
+        self.assertEqual(len(rows(bulk)[1]), 3)
+
+    def test_term_set_counts(self):
+        """Test that the counts of a root follow ingestion and the Terms
+        added or deleted afterwards"""
+        metadata = {'a': {'b': {'t1': {'use': 'Required'}},
+                          't2': {'use': 'Optional'}}}
+        SchemaLedger(schema_name='counted', metadata=metadata,
+                     status=self.status, version='1.0.0').save()
+        root = TermSet.objects.get(name='counted')
+        self.assertEqual((root.term_set_count, root.term_count), (2, 2))
+
+        term = Term(name='t3', term_set=root, status=self.status)
+        term.save()
+        root.refresh_from_db()
+        self.assertEqual(root.term_count, 3)
+
+        ChildTermSet.objects.filter(root=root, name='b').delete()
+        root.refresh_from_db()
+        self.assertEqual((root.term_set_count, root.term_count), (1, 2))
+
+    def test_ingest_upload(self):
+        """Test that streaming an uploaded file creates the same rows as
+        ingesting the loaded metadata"""
+        metadata = {'a': {'b': {'t1': {'use': 'Required',
+                                       'data_type': 'str',
+                                       'extra': {'x': [1, {'y': 2}]}}},
+                          'n': {'first': 1, 'then': {'use': 'Optional'}},
+                          'e': {},
+                          't2': {'use': 'Optional'}},
+                    't3': {'use': 'Recommended', 'description': 'desc'},
+                    'list': [{'use': 'Required'}],
+                    'skip': 'value'}
+        loaded = TermSet.objects.create(name='loaded', version='1.0.0',
+                                        status=self.status)
+        streamed = TermSet.objects.create(name='streamed', version='1.0.0',
+                                          status=self.status)
+
+        ingest_metadata(metadata, loaded, self.status, self.user)
+        ingestor = ingest_upload(ContentFile(json.dumps(metadata).encode()),
+                                 streamed, self.status, self.user)
+
+        def rows(root):
+            return (list(ChildTermSet.objects.filter(root=root).values_list(
+                        'path', 'status').order_by('path')),
+                    list(Term.objects.filter(root=root).values_list(
+                        'path', 'use', 'data_type',
+                        'description').order_by('path')))
+
+        self.assertEqual(rows(streamed), rows(loaded))
+        self.assertEqual(ingestor.term_set_count, 2)
+        self.assertEqual(ingestor.term_count, 3)
+
+    def test_ingest_version(self):
+        """Test that a new version matches a fresh ingestion, copies the
+        unchanged Terms and carries over their mappings"""
+        SchemaLedger(schema_name='target', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        target = TermSet.objects.get(iri='xss:1.0.0@target')
+        previous = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        termset_map(target, previous, {'test': {'test1': 'test.test1',
+                                                'test2': 'test.test2'}})
+        metadata = {'test': {'test1': {'use': 'Required', 'type': 'int'},
+                             'test2': {'use': 'Required'},
+                             'test3': {'use': 'Optional'}},
+                    'other': {'inner': {'use': 'Recommended'}}}
+
+        SchemaLedger(schema_name='test_name', metadata=metadata,
+                     status=self.status, version='1.0.1', major_version=1,
+                     patch_version=1, reuse_previous_version=True).save()
+        fresh = TermSet.objects.create(name='fresh', version='1.0.1',
+                                       status=self.status)
+        ingest_metadata(metadata, fresh, self.status, self.user)
+        new = TermSet.objects.get(iri='xss:1.0.1@test_name')
+
+        def rows(root):
+            return (list(ChildTermSet.objects.filter(root=root).values_list(
+                        'path', 'status').order_by('path')),
+                    list(Term.objects.filter(root=root).values_list(
+                        'path', 'use', 'data_type',
+                        'description').order_by('path')))
+
+        self.assertEqual(rows(new), rows(fresh))
+        for name in ('test1', 'test2'):
+            term = new.descendant_terms.get(name=name)
+            self.assertEqual(
+                list(term.mapping.values_list('iri', flat=True)),
+                ['xss:1.0.0@target/test?' + name])
+        self.assertFalse(new.descendant_terms.get(
+            name='test3').mapping.exists())
+
+    def test_ingest_duplicate_version(self):
+        """Test that an upload with the same content as another version is
+        cloned from it with its mappings instead of ingested"""
+        SchemaLedger(schema_name='target', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        SchemaLedger(schema_name='cloned', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        target = TermSet.objects.get(iri='xss:1.0.0@target')
+        previous = TermSet.objects.get(iri='xss:1.0.0@cloned')
+        termset_map(target, previous, {'test': {'test1': 'test.test1'}})
+        # same content with a different key order
+        metadata = {'test': {'test2': self.metadata['test']['test2'],
+                             'test1': self.metadata['test']['test1']}}
+
+        with patch('core.management.utils.ingest_utils.ingest_metadata') \
+                as ingest:
+            SchemaLedger(schema_name='cloned', metadata=metadata,
+                         status=self.status, version='1.0.1',
+                         major_version=1, patch_version=1).save()
+
+        ingest.assert_not_called()
+        new = TermSet.objects.get(iri='xss:1.0.1@cloned')
+        self.assertEqual(TermSetTree(new).export(),
+                         TermSetTree(previous).export())
+        self.assertEqual(list(new.descendant_terms.get(
+            name='test1').mapping.values_list('iri', flat=True)),
+            ['xss:1.0.0@target/test?test1'])
+
+    def test_ingest_duplicate_version_edited(self):
+        """Test that rows retired or edited since a version was ingested
+        are ingested from the metadata instead of copied, and copied Terms
+        get new uuids and keep their search tokens"""
+        metadata = {**self.metadata,
+                    'other': {'inner': {'use': 'Optional'}}}
+        SchemaLedger(schema_name='edited', metadata=metadata,
+                     status=self.status, version=self.version).save()
+        previous = TermSet.objects.get(iri='xss:1.0.0@edited')
+        exported = TermSetTree(previous).export()
+        Term.objects.filter(iri='xss:1.0.0@edited/test?test1').update(
+            status='retired')
+        Term.objects.filter(iri='xss:1.0.0@edited/test?test2').update(
+            description='edited')
+
+        with patch('core.management.utils.ingest_utils.clone_version') \
+                as clone:
+            SchemaLedger(schema_name='edited', metadata=metadata,
+                         status=self.status, version='1.0.1',
+                         major_version=1, patch_version=1).save()
+
+        clone.assert_not_called()
+        new = TermSet.objects.get(iri='xss:1.0.1@edited')
+
+        self.assertEqual(TermSetTree(new).export(), exported)
+        self.assertFalse(new.descendant_terms.exclude(
+            status='published').exists())
+        self.assertFalse(new.descendant_terms.filter(
+            uuid__in=previous.descendant_terms.values('uuid')).exists())
+        for word in ('test1', 'inner'):
+            self.assertEqual(len(search_terms(word, schema=new.iri)), 1)
+
+    def test_tokenize(self):
+        """Test that words and the parts of camel case words are tokens"""
+        self.assertEqual(tokenize('Course.CourseTitle of a_course'),
+                         ['course', 'coursetitle', 'course', 'title', 'of',
+                          'a', 'course'])
+
+    def test_search_terms(self):
+        """Test that searches match every token, prefixes and filters and
+        rank name matches first"""
+        root = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        Term(term_set=root, name='Title', use='Optional', data_type='str',
+             description='course title', status=self.status).save()
+        Term(term_set=root, name='Code', use='Optional',
+             description='course title code', status=self.status).save()
+
+        def found(query, **filters):
+            return [term.name for term, _ in search_terms(query, **filters)]
+
+        self.assertEqual(found('title'), ['Title', 'Code'])
+        self.assertEqual(found('course tit*'), ['Title', 'Code'])
+        self.assertEqual(found('title code'), ['Code'])
+        self.assertEqual(found('title', data_type='str'), ['Title'])
+        self.assertEqual(found('test1', schema=root.iri), ['test1'])
+        self.assertEqual(found('test1', name='other'), [])
+        self.assertEqual(found('tit'), [])
+
+    def test_stream_mapping(self):
+        """Test that an uploaded mapping file flattens like a loaded one"""
+        mapping = {'Course Info': {'Title': 'Course.Course Title',
+                                   'Codes': ['a.b'],
+                                   'Empty': {}},
+                   'Code': 'Course.Code'}
+
+        self.assertEqual(
+            list(stream_mapping(ContentFile(json.dumps(mapping).encode()))),
+            list(flatten_mapping(mapping)))
+
+    def test_termset_map(self):
+        """Test that mappings are written in bulk and bad paths skipped"""
+        source = TermSet.objects.get(iri='xss:1.0.0@test_name')
+        SchemaLedger(schema_name='target', metadata=self.metadata,
+                     status=self.status, version=self.version).save()
+        target = TermSet.objects.get(iri='xss:1.0.0@target')
+        mapping = {'test': {'test1': 'test.test2', 'test2': 'test.missing'},
+                   'missing': {'test1': 'test.test1'}}
+
+        with self.assertNumQueries(3):
+            count = termset_map(target, source, mapping)
+
+        self.assertEqual(count, 1)
+        term = target.descendant_terms.get(name='test1')
+        self.assertEqual(list(term.mapping.values_list('iri', flat=True)),
+                         ['xss:1.0.0@test_name/test?test2'])
+
+    def test_termset_map_child_term_sets(self):
+        """Test that mapping paths are relative to a Child Term Set used as
+        the target or source"""
+        SchemaLedger(schema_name='src', metadata={'Course': {
+            'Title': {'use': 'Required'}}},
+            status=self.status, version=self.version).save()
+        SchemaLedger(schema_name='tgt', metadata={'Item': {
+            'Name': {'use': 'Required'}}},
+            status=self.status, version=self.version).save()
+        source = TermSet.objects.get(iri='xss:1.0.0@src/Course')
+        target = TermSet.objects.get(iri='xss:1.0.0@tgt/Item')
+
+        self.assertEqual(termset_map(target, source, {'Name': 'Title'}), 1)
+        self.assertEqual(list(Term.objects.get(
+            iri='xss:1.0.0@tgt/Item?Name').mapping.values_list(
+            'iri', flat=True)), ['xss:1.0.0@src/Course?Title'])
+        self.assertEqual(termset_map(
+            TermSet.objects.get(iri='xss:1.0.0@tgt'), source,
+            {'Item': {'Name': 'Title'}}), 1)
+
+    def test_record_validator(self):
+        """Test that the validator reports missing, mistyped and unexpected
+        fields"""
+        validator = RecordValidator({
+            'Course': {
+                'Code': {'use': 'Required', 'data_type': 'int'},
+                'Title': {'use': 'Optional', 'data_type': 'str'},
+                'Flag': {'use': 'Optional', 'data_type': 'unknown'}}})
+
+        self.assertEqual(validator.validate(
+            {'Course': {'Code': 1, 'Title': 'x', 'Flag': []}}), [])
+        self.assertEqual(validator.validate(
+            {'Course': {'Code': True, 'Other': 1}, 'Extra': {}}),
+            ['Course.Code: expected int', 'Course.Other: unexpected field',
+             'Extra: unexpected field'])
+        self.assertEqual(validator.validate({}),
+                         ['Course.Code: required field is missing'])
@@ -172,6 +172,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Run schema ingestion and mapping jobs in the ingestworker command instead
+# of inside the admin request that uploaded them
+ASYNC_INGESTION = os.environ.get('ASYNC_INGESTION', 'false').lower() == 'true'
+
+# Seconds without progress after which a running ingestion job is taken to
+# be abandoned by its worker and queued again
+INGESTION_JOB_TIMEOUT = int(os.environ.get('INGESTION_JOB_TIMEOUT') or 600)
+
+# Uploaded schema and mapping files larger than this many bytes are kept as
+# files and parsed while ingesting instead of being loaded into the ledger
+STREAMING_UPLOAD_THRESHOLD = int(
+    os.environ.get('STREAMING_UPLOAD_THRESHOLD') or 50 * 1024 * 1024)
+
+# Upper bound in bytes on the decompressed size of gzip or zstd compressed
+# schema and mapping uploads
+MAX_DECOMPRESSED_UPLOAD_SIZE = int(
+    os.environ.get('MAX_DECOMPRESSED_UPLOAD_SIZE') or 1024 * 1024 * 1024)
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly',
@@ -3,5 +3,7 @@
 if [ -n "$DJANGO_SUPERUSER_USERNAME" ] && [ -n "$DJANGO_SUPERUSER_PASSWORD" ] ; then
     (cd openlxp-xss; python manage.py createsuperuser --no-input)
 fi
+# restart the worker if it ever exits
+(cd openlxp-xss; while true; do python manage.py ingestworker; sleep 5; done) &
 (cd openlxp-xss; gunicorn openlxp_xss_project.wsgi --reload --user www-data --bind 0.0.0.0:8010 --workers 3) &
 nginx -g "daemon off;"